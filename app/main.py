@@ -4,6 +4,9 @@ from pydantic import BaseModel
 from typing import List, Dict, Any
 import os
 import re
+import queue
+import logging
+import logging.handlers
 from dotenv import load_dotenv
 
 from .services.rag_service import RAGService
@@ -14,6 +17,7 @@ from .services.smart_summary_service import SmartSummaryService
 from .models.analysis import ChangeAnalysisRequestForm, CodeChange, ChangeAnalysisResponseWithCode
 from .models.test_generation import TestGenerationRequest, TestGenerationResponse, TestGenerationError
 from .utils.diff_utils import is_diff_format, extract_file_content_from_diff
+from .utils.error_handling import RAGServiceError
 
 # Load environment variables
 load_dotenv()
@@ -34,15 +38,41 @@ app.add_middleware(
 )
 
 # Initialize services
-rag_service = RAGService()
+# One Azure OpenAI client shared by every service, so its caches and request batching are too
 openai_service = AzureOpenAIService()
-test_generation_service = TestGenerationService()
+rag_service = RAGService(openai_service)
+test_generation_service = TestGenerationService(openai_service)
 smart_summary_service = SmartSummaryService()
 
 # Conditionally initialize ADO service
 ENABLE_ADO_INTEGRATION = os.getenv("ENABLE_ADO_INTEGRATION", "false").lower() == "true"
 ado_service = AzureDevOpsService() if ENABLE_ADO_INTEGRATION else None
 
+# Drains queued log records on a background thread so handlers never block the event loop
+log_listener = None
+
+@app.on_event("startup")
+async def start_logging():
+    """Route log records through a queue to the configured handlers"""
+    global log_listener
+    root_logger = logging.getLogger()
+    root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    handlers = root_logger.handlers or [logging.StreamHandler()]
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    log_listener.start()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """Close long-lived HTTP sessions and workers and flush pending log records"""
+    if ado_service:
+        await ado_service.aclose()
+    rag_service.close()
+    if log_listener:
+        log_listener.stop()
+        logging.getLogger().handlers = list(log_listener.handlers)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -111,8 +141,8 @@ async def analyze_changes(
             related_code
         )
         
-        # 3. Format response
-        response = ChangeAnalysisResponseWithCode(
+        # 3. Format response (fields come from an already-validated model)
+        response = ChangeAnalysisResponseWithCode.model_construct(
             summary=analysis_result.summary,
             changed_components=analysis_result.changed_components,
             dependency_chains=analysis_result.dependency_chains,
@@ -133,6 +163,8 @@ async def analyze_changes(
         
         return response
         
+    except RAGServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -169,6 +201,8 @@ async def index_repository(file: UploadFile = File(...)):
         result = await rag_service.index_repository(file)
         return {"status": "success", "indexed_files": result.indexed_files}
         
+    except RAGServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
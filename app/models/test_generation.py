@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Any
 from enum import Enum
@@ -40,7 +41,8 @@ class TestCase(BaseModel):
     tags: List[str] = []
     related_files: List[str] = []
 
-class AdoTestCase(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AdoTestCase:
     id: int
     title: str
     state: str
@@ -50,22 +52,25 @@ class AdoTestCase(BaseModel):
     test_suite_id: Optional[int] = None
     last_execution_outcome: Optional[str] = None
 
-class TestSuite(BaseModel):
+@dataclass(slots=True)
+class TestSuite:
     id: int
     name: str
     test_case_count: int
     parent_suite_id: Optional[int] = None
 
-class WorkItemInfo(BaseModel):
+@dataclass(slots=True)
+class WorkItemInfo:
     id: int
     title: str
     state: Optional[str] = None
 
-class WorkItemHierarchy(BaseModel):
+@dataclass(slots=True)
+class WorkItemHierarchy:
     epic: Optional[WorkItemInfo] = None
     feature: Optional[WorkItemInfo] = None
     user_story: Optional[WorkItemInfo] = None
-    tasks: List[WorkItemInfo] = []
+    tasks: List[WorkItemInfo] = field(default_factory=list)
 
 class TestGenerationOptions(BaseModel):
     include_ui_tests: bool = True
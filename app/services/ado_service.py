@@ -1,11 +1,32 @@
 import os
+import functools
 from urllib.parse import quote
-from typing import Dict, Any
-from azure.devops.connection import Connection
-from msrest.authentication import BasicAuthentication
+from typing import Dict, Any, List
 from ..models.analysis import ChangeAnalysisResponse
+from ..models.test_generation import AdoTestCase, TestSuite
 from ..services.ado_test_service import AdoTestService
 
+# Fields written by update_work_item, in the order their values are supplied
+_WORK_ITEM_PATCH_TEMPLATE = (
+    {"op": "add", "path": "/fields/System.Description"},
+    {"op": "add", "path": "/fields/Custom.ImpactAnalysis"}
+)
+
+@functools.lru_cache(maxsize=1)
+def _get_ado_connection(organization: str, personal_access_token: str):
+    """Create the Azure DevOps connection once per configuration"""
+    # Imported lazily so workers that never update work items skip loading the SDK
+    from azure.devops.connection import Connection
+    from msrest.authentication import BasicAuthentication
+    
+    # Properly encode organization name and construct URL
+    encoded_org = quote(organization, safe='')
+    organization_url = f"https://dev.azure.com/{encoded_org}"
+    
+    # Create a connection to Azure DevOps; it caches the clients it hands out
+    credentials = BasicAuthentication('', personal_access_token)
+    return Connection(base_url=organization_url, creds=credentials)
+
 class AzureDevOpsService:
     def __init__(self):
         # Initialize Azure DevOps client
@@ -16,17 +37,9 @@ class AzureDevOpsService:
         if not personal_access_token or not organization or not project:
             raise ValueError("Missing required Azure DevOps configuration: AZURE_DEVOPS_PAT, AZURE_DEVOPS_ORG, and AZURE_DEVOPS_PROJECT must be set")
         
-        # Properly encode organization name and construct URL
-        encoded_org = quote(organization, safe='')
-        organization_url = f"https://dev.azure.com/{encoded_org}"
-        
-        # Create a connection to Azure DevOps
-        credentials = BasicAuthentication('', personal_access_token)
-        self.connection = Connection(base_url=organization_url, creds=credentials)
-        
-        # Get clients
-        self.git_client = self.connection.clients.get_git_client()
-        self.work_item_client = self.connection.clients.get_work_item_tracking_client()
+        # SDK connection and clients are created on first use
+        self._organization = organization
+        self._personal_access_token = personal_access_token
         
         # Store project name
         self.project = project
@@ -34,6 +47,21 @@ class AzureDevOpsService:
         # Initialize test service
         self.test_service = AdoTestService()
 
+    @functools.cached_property
+    def connection(self):
+        """Azure DevOps SDK connection, shared across instances"""
+        return _get_ado_connection(self._organization, self._personal_access_token)
+    
+    @functools.cached_property
+    def git_client(self):
+        """Azure DevOps Git client"""
+        return self.connection.clients.get_git_client()
+    
+    @functools.cached_property
+    def work_item_client(self):
+        """Azure DevOps work item tracking client"""
+        return self.connection.clients.get_work_item_tracking_client()
+
     async def update_work_item(self, work_item_id: str, analysis: ChangeAnalysisResponse):
         """
         Update Azure DevOps work item with analysis results
@@ -44,16 +72,11 @@ class AzureDevOpsService:
             
             # Create patch document
             patch_document = [
-                {
-                    "op": "add",
-                    "path": "/fields/System.Description",
-                    "value": markdown_content
-                },
-                {
-                    "op": "add",
-                    "path": "/fields/Custom.ImpactAnalysis",
-                    "value": str(analysis.dict())
-                }
+                {**op, "value": value}
+                for op, value in zip(
+                    _WORK_ITEM_PATCH_TEMPLATE,
+                    (markdown_content, analysis.model_dump_json(exclude_none=True))
+                )
             ]
             
             # Update work item
@@ -68,19 +91,23 @@ class AzureDevOpsService:
         except Exception as e:
             raise Exception(f"Failed to update work item: {str(e)}")
 
-    async def get_work_item(self, work_item_id: int):
+    async def aclose(self) -> None:
+        """Release pooled HTTP connections held by the test service"""
+        await self.test_service.aclose()
+
+    async def get_work_item(self, work_item_id: int) -> Dict[str, Any]:
         """Get work item details"""
         return await self.test_service.get_work_item(work_item_id)
     
-    async def get_work_item_relations(self, work_item_id: int):
+    async def get_work_item_relations(self, work_item_id: int) -> List[Dict[str, Any]]:
         """Get work item relations"""
         return await self.test_service.get_work_item_relations(work_item_id)
     
-    async def get_linked_test_cases(self, work_item_id: int):
+    async def get_linked_test_cases(self, work_item_id: int) -> List[AdoTestCase]:
         """Get test cases linked to work item"""
         return await self.test_service.get_linked_test_cases(work_item_id)
     
-    async def get_test_suites_by_area(self, area_path: str):
+    async def get_test_suites_by_area(self, area_path: str) -> List[TestSuite]:
         """Get test suites by area path"""
         return await self.test_service.get_test_suites_by_area(area_path)
 
@@ -88,54 +115,52 @@ class AzureDevOpsService:
         """
         Format the analysis results as markdown for Azure DevOps
         """
-        markdown = f"""
+        parts: List[str] = [f"""
 # Code Change Impact Analysis
 
 ## Summary
 {analysis.summary}
-"""
+"""]
 
         if analysis.risk_level:
-            markdown += f"\n## Risk Level: {analysis.risk_level.value.upper()}\n"
+            parts.append(f"\n## Risk Level: {analysis.risk_level.value.upper()}\n")
 
-        markdown += "\n## Changed Components\n"
+        parts.append("\n## Changed Components\n")
         
         for component in analysis.changed_components:
-            markdown += f"""
+            parts.append(f"""
 ### {component.file_path}
 - **Methods**: {', '.join(component.methods)}
 - **Impact**: {component.impact_description}
 - **Risk Level**: {component.risk_level.value}
 - **Associated Unit Tests**: {', '.join(component.associated_unit_tests)}
-"""
+""")
 
         if analysis.dependency_chains:
-            markdown += "\n## Dependency Chains\n"
+            parts.append("\n## Dependency Chains\n")
             
             for chain in analysis.dependency_chains:
-                markdown += f"""
+                parts.append(f"""
 ### {chain.file_path}
 #### Changed Methods:
-"""
+""")
                 for method in chain.methods:
-                    markdown += f"- **{method.name}**: {method.summary}\n"
+                    parts.append(f"- **{method.name}**: {method.summary}\n")
                 
-                markdown += "\n#### Impacted Files:\n"
+                parts.append("\n#### Impacted Files:\n")
                 for imp_file in chain.impacted_files:
-                    markdown += f"\n##### {imp_file.file_path}\n"
+                    parts.append(f"\n##### {imp_file.file_path}\n")
                     for method in imp_file.methods:
-                        markdown += f"- **{method.name}**: {method.summary}\n"
+                        parts.append(f"- **{method.name}**: {method.summary}\n")
                 
                 if chain.associated_unit_tests:
-                    markdown += f"\n#### Associated Unit Tests:\n"
+                    parts.append("\n#### Associated Unit Tests:\n")
                     for test in chain.associated_unit_tests:
-                        markdown += f"- {test}\n"
+                        parts.append(f"- {test}\n")
 
         if analysis.dependency_chain_visualization:
-            markdown += "\n## Dependency Chain Visualization\n"
-            markdown += "```\n"
-            for chain in analysis.dependency_chain_visualization:
-                markdown += f"{chain}\n"
-            markdown += "```\n"
+            parts.append("\n## Dependency Chain Visualization\n```\n")
+            parts.append("\n".join(analysis.dependency_chain_visualization))
+            parts.append("\n```\n")
             
-        return markdown 
\ No newline at end of file
+        return "".join(parts)
@@ -1,11 +1,82 @@
 import os
 import base64
 import asyncio
-from typing import List, Dict, Any, Optional
+import functools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 import aiohttp
+import orjson
 from urllib.parse import quote
 from ..models.test_generation import AdoTestCase, TestSuite, WorkItemInfo
 
+# Maximum number of ids accepted by the workitemsbatch endpoint
+WORK_ITEMS_BATCH_SIZE = 200
+
+# Lifetime and size bound of the per-service work item caches
+ADO_CACHE_TTL_SECONDS = 60
+ADO_CACHE_MAX_ENTRIES = 1024
+
+# Fields needed to build an AdoTestCase
+TEST_CASE_FIELDS = [
+    'System.Title',
+    'System.State',
+    'System.AssignedTo',
+    'System.AreaPath',
+    'System.IterationPath',
+    'Microsoft.VSTS.TCM.AutomatedTestStorage'
+]
+
+# ADO priority numbers by priority name
+_PRIORITY_MAP = MappingProxyType({
+    'Critical': 1,
+    'High': 2,
+    'Medium': 3,
+    'Low': 4
+})
+
+# Escape table for text placed inside test step XML
+_XML_ESCAPE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;'
+})
+
+@dataclass(frozen=True)
+class _AdoAuthContext:
+    """Precomputed base URL and request headers for the ADO REST API"""
+    base_url: str
+    headers: Tuple[Tuple[str, str], ...]
+
+@functools.lru_cache(maxsize=1)
+def _ado_auth_context(organization: str, project: str, pat_token: str) -> _AdoAuthContext:
+    """Build the ADO base URL and auth headers once per configuration"""
+    # Properly encode organization and project names to handle special characters
+    encoded_org = quote(organization, safe='')
+    encoded_project = quote(project, safe='')
+    base_url = f"https://dev.azure.com/{encoded_org}/{encoded_project}/_apis"
+    
+    # Create authorization header
+    # Use empty username with PAT token for basic auth
+    auth_string = f":{pat_token}"
+    auth_bytes = auth_string.encode('ascii')
+    auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+    
+    headers = (
+        ('Authorization', f'Basic {auth_b64}'),
+        ('Content-Type', 'application/json'),
+        ('Accept', 'application/json'),
+        ('User-Agent', 'ImpactAnalysisAPI/1.0')
+    )
+    return _AdoAuthContext(base_url=base_url, headers=headers)
+
+def _orjson_dumps(obj: Any) -> str:
+    """JSON serializer for aiohttp's json= arguments"""
+    return orjson.dumps(obj).decode()
+
 class AdoTestService:
     """Service for Azure DevOps Test Management API integration"""
     
@@ -17,25 +88,87 @@ class AdoTestService:
         if not all([self.organization, self.project, self.pat_token]):
             raise ValueError("Missing required Azure DevOps configuration")
         
-        # Properly encode organization and project names to handle special characters
-        encoded_org = quote(self.organization, safe='')
-        encoded_project = quote(self.project, safe='')
-        self.base_url = f"https://dev.azure.com/{encoded_org}/{encoded_project}/_apis"
+        ctx = _ado_auth_context(self.organization, self.project, self.pat_token)
+        self.base_url = ctx.base_url
+        self.headers = dict(ctx.headers)
         
-        # Create authorization header
-        # Use empty username with PAT token for basic auth
-        auth_string = f":{self.pat_token}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+        # Shared HTTP session, created lazily so it binds to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
         
-        self.headers = {
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'ImpactAnalysisAPI/1.0'
-        }
+        # Cap concurrent fan-out requests to respect ADO rate limits
+        self._request_semaphore = asyncio.Semaphore(16)
+        
+        # Short-lived caches of work item reads, holding in-flight futures so duplicate reads share one request
+        self._work_item_cache: "OrderedDict[int, Tuple[float, asyncio.Future]]" = OrderedDict()
+        self._test_case_cache: "OrderedDict[int, Tuple[float, asyncio.Future]]" = OrderedDict()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, reusing pooled keep-alive connections"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                json_serialize=_orjson_dumps,
+                connector=aiohttp.TCPConnector(
+                    limit=32,
+                    limit_per_host=16,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=30
+                )
+            )
+        return self._session
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _cached_fetch(
+        self,
+        cache: "OrderedDict[int, Tuple[float, asyncio.Future]]",
+        key: int,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Return a cached or in-flight result for key, fetching it at most once per TTL"""
+        now = time.monotonic()
+        entry = cache.get(key)
+        if entry and entry[0] > now:
+            # Shield so a cancelled waiter does not cancel the shared request
+            return await asyncio.shield(entry[1])
+        
+        future = asyncio.get_running_loop().create_future()
+        # Re-insert at the end so insertion order stays in expiry order
+        cache.pop(key, None)
+        cache[key] = (now + ADO_CACHE_TTL_SECONDS, future)
+        while len(cache) > ADO_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+        # Expired entries are all at the front; drop them so they don't hold memory until evicted
+        while cache and next(iter(cache.values()))[0] <= now:
+            cache.popitem(last=False)
+        
+        try:
+            result = await fetch()
+        except BaseException as e:
+            if cache.get(key, (None, None))[1] is future:
+                del cache[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Mark the exception retrieved in case no other caller is waiting
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        
+        future.set_result(result)
+        return result
     
     async def get_work_item(self, work_item_id: int) -> Dict[str, Any]:
+        """Get work item details from ADO, cached for a short TTL"""
+        return await self._cached_fetch(
+            self._work_item_cache, work_item_id, lambda: self._fetch_work_item(work_item_id)
+        )
+    
+    async def _fetch_work_item(self, work_item_id: int) -> Dict[str, Any]:
         """Get work item details from ADO"""
         url = f"{self.base_url}/wit/workitems/{work_item_id}"
         params = {
@@ -43,14 +176,14 @@ class AdoTestService:
             '$expand': 'fields,relations'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status == 404:
-                    raise ValueError(f"Work item {work_item_id} not found")
-                elif response.status != 200:
-                    raise Exception(f"ADO API error: {response.status}")
+        session = await self._get_session()
+        async with session.get(url, params=params) as response:
+            if response.status == 404:
+                raise ValueError(f"Work item {work_item_id} not found")
+            elif response.status != 200:
+                raise Exception(f"ADO API error: {response.status}")
                 
-                return await response.json()
+            return orjson.loads(await response.read())
     
     async def get_work_item_relations(self, work_item_id: int) -> List[Dict[str, Any]]:
         """Get work item relations"""
@@ -68,27 +201,40 @@ class AdoTestService:
                 r for r in relations 
                 if r.get('rel') == 'Microsoft.VSTS.Common.TestedBy'
             ]
+            if not test_case_relations:
+                return []
             
-            test_cases = []
+            test_case_ids = []
             for relation in test_case_relations:
                 # Extract test case ID from URL
-                test_case_url = relation.get('url', '')
-                test_case_id = test_case_url.split('/')[-1]
-                
+                test_case_url = relation.get('url')
+                if not test_case_url:
+                    continue
+                test_case_id = test_case_url.rpartition('/')[2]
                 try:
-                    test_case_data = await self.get_test_case(int(test_case_id))
-                    test_cases.append(self._convert_to_ado_test_case(test_case_data))
-                except Exception as e:
+                    test_case_ids.append(int(test_case_id))
+                except ValueError as e:
                     print(f"Error fetching test case {test_case_id}: {e}")
-                    continue
             
-            return test_cases
+            if not test_case_ids:
+                return []
+            
+            # Fetch all linked test cases in batched requests
+            work_items = await self.get_work_items_batch(test_case_ids)
+            
+            return [self._convert_to_ado_test_case(work_item) for work_item in work_items]
             
         except Exception as e:
             print(f"Error getting linked test cases: {e}")
             return []
     
     async def get_test_case(self, test_case_id: int) -> Dict[str, Any]:
+        """Get individual test case details, cached for a short TTL"""
+        return await self._cached_fetch(
+            self._test_case_cache, test_case_id, lambda: self._fetch_test_case(test_case_id)
+        )
+    
+    async def _fetch_test_case(self, test_case_id: int) -> Dict[str, Any]:
         """Get individual test case details"""
         url = f"{self.base_url}/wit/workitems/{test_case_id}"
         params = {
@@ -96,12 +242,43 @@ class AdoTestService:
             '$expand': 'fields'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
+        session = await self._get_session()
+        async with self._request_semaphore:
+            async with session.get(url, params=params) as response:
                 if response.status != 200:
                     raise Exception(f"Failed to get test case {test_case_id}: {response.status}")
                 
-                return await response.json()
+                return orjson.loads(await response.read())
+    
+    async def get_work_items_batch(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get multiple work items, up to 200 per request"""
+        url = f"{self.base_url}/wit/workitemsbatch"
+        params = {
+            'api-version': '7.0'
+        }
+        fields = fields or TEST_CASE_FIELDS
+        
+        session = await self._get_session()
+        
+        async def fetch_chunk(chunk_ids: List[int]) -> List[Dict[str, Any]]:
+            batch_request = {
+                'ids': chunk_ids,
+                'fields': fields,
+                'errorPolicy': 'Omit'
+            }
+            async with self._request_semaphore:
+                async with session.post(url, params=params, json=batch_request) as response:
+                    if response.status != 200:
+                        raise Exception(f"Failed to get work items batch: {response.status}")
+                    
+                    data = orjson.loads(await response.read())
+                    # Items that could not be read come back as null with errorPolicy=Omit
+                    return [item for item in data.get('value', []) if item]
+        
+        chunks = await asyncio.gather(
+            *(fetch_chunk(ids[i:i + WORK_ITEMS_BATCH_SIZE]) for i in range(0, len(ids), WORK_ITEMS_BATCH_SIZE))
+        )
+        return [item for chunk in chunks for item in chunk]
     
     async def get_test_suites_by_area(self, area_path: str) -> List[TestSuite]:
         """Get test suites in a specific area path"""
@@ -109,10 +286,17 @@ class AdoTestService:
             # First, get all test plans
             test_plans = await self.get_test_plans()
             
+            # Fetch suites for all plans concurrently, letting ADO pre-filter by area path
+            plan_suites = await asyncio.gather(
+                *(self.get_test_suites_in_plan(plan['id'], area_path=area_path) for plan in test_plans),
+                return_exceptions=True
+            )
+            
             test_suites = []
-            for plan in test_plans:
-                plan_id = plan['id']
-                suites = await self.get_test_suites_in_plan(plan_id)
+            for plan, suites in zip(test_plans, plan_suites):
+                if isinstance(suites, Exception):
+                    print(f"Error getting test suites for plan {plan['id']}: {suites}")
+                    continue
                 
                 # Filter suites by area path
                 for suite in suites:
@@ -137,29 +321,31 @@ class AdoTestService:
             'api-version': '7.0'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to get test plans: {response.status}")
+        session = await self._get_session()
+        async with session.get(url, params=params) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to get test plans: {response.status}")
                 
-                data = await response.json()
-                return data.get('value', [])
+            data = orjson.loads(await response.read())
+            return data.get('value', [])
     
-    async def get_test_suites_in_plan(self, plan_id: int) -> List[Dict[str, Any]]:
+    async def get_test_suites_in_plan(self, plan_id: int, area_path: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get test suites in a specific test plan"""
         url = f"{self.base_url}/test/plans/{plan_id}/suites"
         params = {
             'api-version': '7.0',
             '$expand': 'children'
         }
+        if area_path:
+            params['areaPath'] = area_path
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if response.status != 200:
-                    return []
+        session = await self._get_session()
+        async with session.get(url, params=params) as response:
+            if response.status != 200:
+                return []
                 
-                data = await response.json()
-                return data.get('value', [])
+            data = orjson.loads(await response.read())
+            return data.get('value', [])
     
     async def search_test_cases_by_keywords(self, keywords: str) -> List[AdoTestCase]:
         """Search for test cases using keywords"""
@@ -178,19 +364,17 @@ class AdoTestService:
                 'top': 50
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=self.headers, params=params, json=search_request) as response:
-                    if response.status != 200:
-                        return []
-                    
-                    data = await response.json()
-                    test_cases = []
-                    
-                    for result in data.get('results', []):
-                        test_case_data = await self.get_test_case(result['workItem']['id'])
-                        test_cases.append(self._convert_to_ado_test_case(test_case_data))
+            session = await self._get_session()
+            async with session.post(url, params=params, json=search_request) as response:
+                if response.status != 200:
+                    return []
                     
-                    return test_cases
+                data = orjson.loads(await response.read())
+            
+            # Fetch the matching test cases in batched requests
+            test_case_ids = [result['workItem']['id'] for result in data.get('results', [])]
+            work_items = await self.get_work_items_batch(test_case_ids)
+            return [self._convert_to_ado_test_case(work_item) for work_item in work_items]
                     
         except Exception as e:
             print(f"Error searching test cases: {e}")
@@ -231,60 +415,47 @@ class AdoTestService:
                 'value': steps_xml
             })
         
-        headers = {**self.headers, 'Content-Type': 'application/json-patch+json'}
+        headers = {'Content-Type': 'application/json-patch+json'}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, params=params, json=patch_document) as response:
-                if response.status not in [200, 201]:
-                    raise Exception(f"Failed to create test case: {response.status}")
+        session = await self._get_session()
+        async with session.post(url, headers=headers, params=params, data=orjson.dumps(patch_document)) as response:
+            if response.status not in [200, 201]:
+                raise Exception(f"Failed to create test case: {response.status}")
                 
-                data = await response.json()
-                return data['id']
+            data = orjson.loads(await response.read())
+            return data['id']
     
     def _convert_to_ado_test_case(self, work_item_data: Dict[str, Any]) -> AdoTestCase:
         """Convert ADO work item data to AdoTestCase model"""
         fields = work_item_data.get('fields', {})
+        assigned_to = fields.get('System.AssignedTo')
         
         return AdoTestCase(
             id=work_item_data['id'],
             title=fields.get('System.Title', ''),
             state=fields.get('System.State', ''),
-            assigned_to=fields.get('System.AssignedTo', {}).get('displayName'),
+            assigned_to=assigned_to.get('displayName') if assigned_to else None,
             area_path=fields.get('System.AreaPath', ''),
             iteration_path=fields.get('System.IterationPath', ''),
             test_suite_id=None,  # Would need additional API call to get this
             last_execution_outcome=fields.get('Microsoft.VSTS.TCM.AutomatedTestStorage')
         )
     
-    def _convert_priority_to_ado(self, priority: str) -> int:
+    @staticmethod
+    def _convert_priority_to_ado(priority: str) -> int:
         """Convert priority string to ADO priority number"""
-        priority_map = {
-            'Critical': 1,
-            'High': 2,
-            'Medium': 3,
-            'Low': 4
-        }
-        return priority_map.get(priority, 3)
+        return _PRIORITY_MAP.get(priority, 3)
     
     def _convert_test_steps_to_xml(self, test_steps: List[Dict[str, Any]]) -> str:
         """Convert test steps to ADO XML format"""
-        steps_xml = '<steps id="0" last="1">'
-        
-        for i, step in enumerate(test_steps, 1):
-            action = step.get('action', '').replace('<', '&lt;').replace('>', '&gt;')
-            expected = step.get('expected_result', '').replace('<', '&lt;').replace('>', '&gt;')
-            
-            steps_xml += f'''
-            <step id="{i}" type="ActionStep">
-                <parameterizedString isformatted="true">
-                    <DIV><P>{action}</P></DIV>
-                </parameterizedString>
-                <parameterizedString isformatted="true">
-                    <DIV><P>{expected}</P></DIV>
-                </parameterizedString>
-                <description/>
-            </step>
-            '''
+        def step_xml(i: int, step: Dict[str, Any]) -> str:
+            action = step.get('action', '').translate(_XML_ESCAPE)
+            expected = step.get('expected_result', '').translate(_XML_ESCAPE)
+            return (
+                f'<step id="{i}" type="ActionStep">'
+                f'<parameterizedString isformatted="true"><DIV><P>{action}</P></DIV></parameterizedString>'
+                f'<parameterizedString isformatted="true"><DIV><P>{expected}</P></DIV></parameterizedString>'
+                f'<description/></step>'
+            )
         
-        steps_xml += '</steps>'
-        return steps_xml
\ No newline at end of file
+        return '<steps id="0" last="1">' + ''.join(step_xml(i, step) for i, step in enumerate(test_steps, 1)) + '</steps>'
@@ -1,9 +1,15 @@
 import os
+import logging
+import re
 import json
 import asyncio
+import sqlite3
+from array import array
 from functools import lru_cache
-from typing import List, Dict, Any
-from openai import AzureOpenAI
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import orjson
+import tiktoken
+from openai import AsyncAzureOpenAI, BadRequestError
 from ..models.analysis import RiskLevel, ChangeAnalysisResponse, ChangedComponent, CodeChange
 from ..models.analysis import (
     RiskLevel, ChangeAnalysisResponseWithCode, ChangedComponentWithCode, MethodWithCode,
@@ -12,44 +18,28 @@ from ..models.analysis import (
 from .change_summary_service import ChangeSummaryService
 from .method_extractor import MethodExtractor
 from ..utils.diff_utils import is_diff_format
+from ..utils.cache_utils import LRUCache, SqliteCache, stable_hash
 
-class AzureOpenAIService:
-    def __init__(self):
-        self.client = AzureOpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
-        self.deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-        self.embeddings_deployment = os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME")
-        self._embedding_cache = {}
-        self._analysis_cache = {}
-        self.change_summary_service = ChangeSummaryService()
-        self.method_extractor = MethodExtractor()
-
-    @lru_cache(maxsize=100)
-    def _get_cached_prompt_template(self, analysis_type: str) -> str:
-        """Get cached prompt templates for different analysis types"""
-        templates = {
-            "impact_analysis": """Analyze these code changes and their dependencies to provide a comprehensive impact analysis in the required JSON format:
-
-CHANGES:
-{changes}
+logger = logging.getLogger(__name__)
 
-{ui_context}
-
-DEPENDENCY INFORMATION:
-{dependencies}
-
-SIMILAR CODE PATTERNS:
-{similar_code}
+# Maximum number of inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 16
+# Maximum number of embeddings requests in flight per service
+EMBEDDING_MAX_CONCURRENCY = 5
+# Maximum number of cached embeddings and analysis results per service
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "8192"))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "256"))
+# Seconds to wait for more single-text embedding calls before sending a batch
+EMBEDDING_COALESCE_DELAY = 0.02
 
-{diff_summaries}
+# Prompt templates for the supported analysis types
+_PROMPT_TEMPLATES = {
+    "impact_analysis": """Analyze these code changes and their dependencies to provide a comprehensive impact analysis in the required JSON format.
 
 Analyze and include in your response:
 1. A clear summary of the changes and their impact
 2. Detailed analysis of each changed file, including:
-   - Changed methods (use exact names as in code, case and underscores must match) and their new behavior
+   - Changed methods with detailed summaries of what changed and why it matters (use exact names as in code, case and underscores must match, and ONLY include top-level function or method names that actually exist in the provided code for each file; do NOT guess, hallucinate, or include variables/classes/inner blocks)
    - Dependent methods in other files that may be affected
    - For UI components:
      * Component rendering and behavior changes
@@ -60,9 +50,20 @@ Analyze and include in your response:
 3. Complete dependency chains showing how changes propagate through the codebase
 4. Visualization of dependencies between files
 
-IMPORTANT: Respond with ONLY a valid JSON object matching the structure specified. No additional text or explanations.""",
-            
-            "method_analysis": """Analyze the following method changes and provide detailed impact analysis:
+IMPORTANT: Respond with ONLY a valid JSON object matching the structure specified. No additional text or explanations.
+{ui_context}
+DEPENDENCY INFORMATION:
+{dependencies}
+
+SIMILAR CODE PATTERNS:
+{similar_code}
+
+{diff_summaries}
+
+CHANGES:
+{changes}""",
+    
+    "method_analysis": """Analyze the following method changes and provide detailed impact analysis:
 
 METHOD CHANGES:
 {method_changes}
@@ -77,326 +78,11 @@ Provide analysis focusing on:
 4. Error handling modifications
 
 Return as JSON with method-level details."""
-        }
-        return templates.get(analysis_type, templates["impact_analysis"])
-    async def get_embeddings(self, text: str) -> List[float]:
-        """Get embeddings for text using Azure OpenAI"""
-        # Check cache first
-        text_hash = hash(text)
-        if text_hash in self._embedding_cache:
-            return self._embedding_cache[text_hash]
-        
-        try:
-            response = self.client.embeddings.create(
-                model=self.embeddings_deployment,
-                input=text
-            )
-            embedding = response.data[0].embedding
-            
-            # Cache the result
-            self._embedding_cache[text_hash] = embedding
-            return embedding
-            
-        except Exception as e:
-            print(f"Error generating embedding: {e}")
-            raise
-
-    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for multiple texts in batch"""
-        try:
-            # Check cache for each text
-            results = []
-            uncached_texts = []
-            uncached_indices = []
-            
-            for i, text in enumerate(texts):
-                text_hash = hash(text)
-                if text_hash in self._embedding_cache:
-                    results.append(self._embedding_cache[text_hash])
-                else:
-                    results.append(None)
-                    uncached_texts.append(text)
-                    uncached_indices.append(i)
-            
-            # Get embeddings for uncached texts
-            if uncached_texts:
-                response = self.client.embeddings.create(
-                    model=self.embeddings_deployment,
-                    input=uncached_texts
-                )
-                
-                # Update results and cache
-                for i, embedding_data in enumerate(response.data):
-                    embedding = embedding_data.embedding
-                    result_index = uncached_indices[i]
-                    results[result_index] = embedding
-                    
-                    # Cache the result
-                    text_hash = hash(uncached_texts[i])
-                    self._embedding_cache[text_hash] = embedding
-            
-            return results
-            
-        except Exception as e:
-            print(f"Error generating batch embeddings: {e}")
-            raise
-    def _extract_methods(self, content: str, file_path: str = "") -> List[Dict[str, str]]:
-        """Extract methods from code content"""
-        try:
-            # Use the enhanced method extractor
-            method_infos = self.method_extractor.extract_methods_from_content(content, file_path)
-            
-            methods = []
-            for method_info in method_infos:
-                method_content = self.method_extractor.get_method_content(content, method_info)
-                methods.append({
-                    "name": method_info.name,
-                    "content": method_content,
-                    "start_line": method_info.start_line,
-                    "signature": method_info.signature,
-                    "is_async": method_info.is_async,
-                    "is_static": method_info.is_static
-                })
-            
-            return methods
-        
-        except Exception as e:
-            print(f"Error extracting methods from {file_path}: {e}")
-            return []
-    
-    def _identify_changed_methods_from_diff(self, changes: List[CodeChange]) -> Dict[str, List[str]]:
-        """Identify actual method names that contain changes from diffs"""
-        changed_methods_by_file = {}
-        
-        for change in changes:
-            file_path = change.file_path
-            changed_methods = []
-            
-            if change.diff:
-                # Use change summary service to identify methods from diff
-                changed_methods = self.change_summary_service.identify_methods_from_diff(
-                    change.diff, file_path
-                )
-            elif change.content:
-                # For full content, extract all methods (assuming all are changed)
-                method_infos = self.method_extractor.extract_methods_from_content(
-                    change.content, file_path
-                )
-                changed_methods = [method.name for method in method_infos]
-            
-            if changed_methods:
-                changed_methods_by_file[file_path] = changed_methods
-        
-        return changed_methods_by_file
-
-    def _optimize_prompt_content(self, content: str, max_tokens: int = 6000) -> str:
-        """Optimize content for prompt to stay within token limits"""
-        if len(content) <= max_tokens * 4:  # Rough estimate: 1 token ≈ 4 characters
-            return content
-        
-        # Prioritize keeping method definitions and important sections
-        lines = content.split('\n')
-        important_lines = []
-        regular_lines = []
-        
-        for line in lines:
-            if any(keyword in line.lower() for keyword in ['def ', 'function ', 'class ', 'import ', 'from ']):
-                important_lines.append(line)
-            else:
-                regular_lines.append(line)
-        
-        # Start with important lines
-        result = '\n'.join(important_lines)
-        
-        # Add regular lines until we reach the limit
-        remaining_space = max_tokens * 4 - len(result)
-        if remaining_space > 0:
-            additional_content = '\n'.join(regular_lines)
-            if len(additional_content) <= remaining_space:
-                result += '\n' + additional_content
-            else:
-                result += '\n' + additional_content[:remaining_space] + '\n... (content truncated)'
-        
-        return result
-    async def analyze_impact(self, changes: List[CodeChange], related_code: Dict[str, Any]) -> ChangeAnalysisResponseWithCode:
-        """Analyze the impact of code changes using Azure OpenAI and include full method code and impacted file content."""
-        import re
-        def normalize(name):
-            return re.sub(r'[^a-zA-Z0-9]', '', name).lower()
-        
-        # Detect UI components
-        ui_files = [change for change in changes if any(change.file_path.endswith(ext) for ext in ['.jsx', '.tsx', '.vue', '.svelte', '.html', '.css'])]
-        is_ui_change = len(ui_files) > 0
-        
-        # Format changes into a readable structure
-        formatted_changes = []
-        for change in changes:
-            change_text = f"\nFile: {change.file_path}\n"
-            change_text += f"Type: {change.change_type}\n"
-            if change.diff:
-                change_text += f"Diff:\n{change.diff}\n"
-            elif change.content:
-                # Optimize content for prompt
-                optimized_content = self._optimize_prompt_content(change.content)
-                change_text += f"Content:\n{optimized_content}\n"
-            formatted_changes.append(change_text)
-
-        # Add UI-specific context if needed
-        ui_context = ""
-        if is_ui_change:
-            ui_context = """
-            For UI components, analyze:
-            1. Component Structure:
-               - Component hierarchy
-               - Props and state management
-               - Event handlers
-               - Conditional rendering
-               - Styling changes
-            
-            2. User Interactions:
-               - Click events
-               - Form submissions
-               - Input changes
-               - Navigation
-               - Modal/overlay interactions
-            
-            3. Visual Elements:
-               - Layout changes
-               - Styling modifications
-               - Responsive design
-               - Accessibility attributes
-            
-            4. State Management:
-               - Local state changes
-               - Global state updates
-               - Context usage
-               - Props drilling
-            
-            5. Integration Points:
-               - API calls
-               - Event propagation
-               - Parent-child communication
-               - Route changes
-            """
-
-        # Format dependencies information
-        dependencies_text = "\nDependency Analysis:\n"
-        if "direct_dependencies" in related_code:
-            deps = related_code["direct_dependencies"]
-            dependencies_text += "\nIncoming References (files that depend on the changed files):\n"
-            for ref in deps.get("incoming", []):
-                dependencies_text += f"- {ref}\n"
-            
-            dependencies_text += "\nOutgoing References (files that the changed files depend on):\n"
-            for ref in deps.get("outgoing", []):
-                dependencies_text += f"- {ref}\n"
-
-        # Add enhanced dependency information
-        if "enhanced_dependencies" in related_code:
-            enhanced_deps = related_code["enhanced_dependencies"]
-            dependencies_text += "\nEnhanced Dependency Analysis:\n"
-            
-            for method_call_info in enhanced_deps.get("method_calls", []):
-                dependencies_text += f"\nFile: {method_call_info['file']}\n"
-                dependencies_text += f"Method calls: {', '.join(method_call_info['calls'])}\n"
-            
-            for import_info in enhanced_deps.get("import_dependencies", []):
-                dependencies_text += f"\nFile: {import_info['file']}\n"
-                dependencies_text += f"Imports: {', '.join(import_info['imports'])}\n"
-        # Add dependency chain information
-        if "dependency_chains" in related_code:
-            dependencies_text += "\nDetailed Dependency Chains:\n"
-            for chain in related_code["dependency_chains"]:
-                dependencies_text += f"\nFile: {chain['file_path']}\n"
-                dependencies_text += "Dependent Files:\n"
-                for dep in chain.get("dependent_files", []):
-                    dependencies_text += f"- {dep['file_path']}\n"
-                    for method in dep.get("methods", []):
-                        dependencies_text += f"  - Method {method['name']}: {method['summary']}\n"
-
-        if "dependency_visualization" in related_code:
-            dependencies_text += "\nDependency Flow:\n"
-            for viz in related_code["dependency_visualization"]:
-                dependencies_text += f"- {viz}\n"
-
-        # Format similar code information
-        similar_code_text = "\nSimilar Code Analysis:\n"
-        if "similar_code" in related_code:
-            similar = related_code["similar_code"]
-            
-            similar_code_text += "\nSimilar Files:\n"
-            for file in similar.get("files", []):
-                similar_code_text += f"- {file['path']} (similarity: {file['similarity']:.2f})\n"
-                for method in file.get("methods", []):
-                    similar_code_text += f"  - Method: {method.get('name', 'unknown')}\n"
-            
-            similar_code_text += "\nSimilar Methods:\n"
-            for method in similar.get("methods", []):
-                similar_code_text += f"- {method['name']} in {method.get('file_path', 'unknown')} (similarity: {method['similarity']:.2f})\n"
-
-        # --- Functional Diff Summaries ---
-        # Build a map of file_path -> {method_name: summary}
-        functional_summaries = {}
-        for change in changes:
-            file_path = change.file_path
-            base_code = ''  # We don't have base code in this context
-            updated_code = change.content or ''
-            
-            # Generate change analysis for the file
-            if updated_code:
-                change_analysis = self.change_summary_service.analyze_file_changes(
-                    file_path, base_code, updated_code
-                )
-                
-                # Create summaries for each method
-                method_summaries = {}
-                for method_change in change_analysis.get('method_changes', []):
-                    method_name = method_change['method_name']
-                    summary = method_change['summary']
-                    method_summaries[method_name] = summary
-                
-                functional_summaries[file_path] = method_summaries
-        # --- End Functional Diff Summaries ---
-
-        # When building the LLM prompt, include the functional summaries for each changed/impacted method
-        # Instead of sending full code or raw diff, send the summary
-        # Example: Add to the prompt for each changed method:
-        # "Functional change summary for {file_path}.{method_name}: {summary}"
-        # You can concatenate these summaries and add to the prompt before the rest of the context
-        diff_summaries_text = ""
-        for file_path, methods in functional_summaries.items():
-            for method_name, summary in methods.items():
-                diff_summaries_text += f"\nFunctional change summary for {file_path}.{method_name}:\n{summary}\n"
+}
 
-        # Prepare the prompt
-        prompt_template = self._get_cached_prompt_template("impact_analysis")
-        prompt = prompt_template.format(
-            changes=''.join(formatted_changes),
-            ui_context=ui_context,
-            dependencies=dependencies_text,
-            similar_code=similar_code_text,
-            diff_summaries=diff_summaries_text
-        )
-        
-        # Update prompt to instruct LLM to use exact method names as in code, not to guess, and only include top-level functions
-        prompt = prompt.replace(
-            "- Changed methods (use exact names as in code, case and underscores must match) and their new behavior",
-            "- Changed methods with detailed summaries of what changed and why it matters (use exact names as in code, case and underscores must match, and ONLY include top-level function or method names that actually exist in the provided code for each file; do NOT guess, hallucinate, or include variables/classes/inner blocks)"
-        )
-        
-        # Check analysis cache
-        prompt_hash = hash(prompt)
-        if prompt_hash in self._analysis_cache:
-            print("[DEBUG] Using cached analysis result")
-            analysis_json = self._analysis_cache[prompt_hash]
-        else:
-        # Get completion from Azure OpenAI
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": """You are a code analysis expert. Analyze the impact of code changes and their dependencies to provide detailed insights.
+# System prompt for impact analysis. Kept byte-identical across requests so the
+# service can reuse its cached prefix; all per-request data goes in the user message.
+_SYSTEM_PROMPT = """You are a code analysis expert. Analyze the impact of code changes and their dependencies to provide detailed insights.
 IMPORTANT: Your response must be ONLY a valid JSON object with no additional text or explanation.
 
 Required JSON structure:
@@ -486,6 +172,515 @@ Rules:
     - Provide high-level overview of changes in the file
     - Explain the overall purpose and impact
     - Connect individual method changes to file-level impact"""
+
+# System prompt for test case generation
+_TEST_GENERATION_SYSTEM_PROMPT = """You are a test case generation expert. Generate comprehensive test cases based on code analysis.
+                        
+Your response must be ONLY a valid JSON object with the following structure:
+{
+    "test_cases": [
+        {
+            "title": "Test case title",
+            "description": "Detailed description of what this test validates",
+            "category": "API|UI|Integration",
+            "priority": "Critical|High|Medium|Low",
+            "test_steps": [
+                {
+                    "step_number": 1,
+                    "action": "Action to perform",
+                    "expected_result": "Expected outcome",
+                    "test_data": "Required test data (optional)"
+                }
+            ],
+            "preconditions": "Prerequisites for running this test",
+            "test_data_requirements": ["data1", "data2"],
+            "automation_feasibility": "High|Medium|Low|Manual Only",
+            "estimated_duration": 15,
+            "tags": ["regression", "api", "critical"],
+            "related_code_files": ["file1.cs", "file2.cs"]
+        }
+    ]
+}
+
+Rules:
+1. Generate test cases that cover both positive and negative scenarios
+2. Focus on edge cases and boundary conditions
+3. Consider the risk level and prioritize accordingly
+4. Include specific, actionable test steps
+5. Suggest realistic automation feasibility
+6. Include relevant tags for test organization
+7. Map tests to the specific code files they validate"""
+
+# File extensions treated as UI components
+_UI_EXTS = ('.jsx', '.tsx', '.vue', '.svelte', '.html', '.css')
+
+# Extra analysis instructions added to the prompt when UI components change
+_UI_CONTEXT = """
+            For UI components, analyze:
+            1. Component Structure:
+               - Component hierarchy
+               - Props and state management
+               - Event handlers
+               - Conditional rendering
+               - Styling changes
+            
+            2. User Interactions:
+               - Click events
+               - Form submissions
+               - Input changes
+               - Navigation
+               - Modal/overlay interactions
+            
+            3. Visual Elements:
+               - Layout changes
+               - Styling modifications
+               - Responsive design
+               - Accessibility attributes
+            
+            4. State Management:
+               - Local state changes
+               - Global state updates
+               - Context usage
+               - Props drilling
+            
+            5. Integration Points:
+               - API calls
+               - Event propagation
+               - Parent-child communication
+               - Route changes
+            """
+
+# Characters dropped when matching method names
+_NORMALIZE_RE = re.compile(r'[^a-zA-Z0-9]')
+
+# Lines with definitions or imports, kept first when prompt content is truncated
+_IMPORTANT_LINE = re.compile(r'\b(?:def|function|class|import|from) ', re.IGNORECASE)
+
+def _normalize_name(name: str) -> str:
+    """Normalize a method name for robust matching"""
+    return _NORMALIZE_RE.sub('', name).lower()
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Optional["tiktoken.Encoding"]:
+    """Load the tokenizer once; None if its encoding data cannot be loaded"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, falling back to character estimates: %s", e)
+        return None
+
+def _iter_dependency_lines(related_code: Dict[str, Any]) -> Iterator[str]:
+    """Yield the dependency analysis section of the impact prompt"""
+    yield "\nDependency Analysis:\n"
+    if "direct_dependencies" in related_code:
+        deps = related_code["direct_dependencies"]
+        yield "\nIncoming References (files that depend on the changed files):\n"
+        yield from (f"- {ref}\n" for ref in deps.get("incoming", []))
+        yield "\nOutgoing References (files that the changed files depend on):\n"
+        yield from (f"- {ref}\n" for ref in deps.get("outgoing", []))
+
+    if "enhanced_dependencies" in related_code:
+        enhanced_deps = related_code["enhanced_dependencies"]
+        yield "\nEnhanced Dependency Analysis:\n"
+        for method_call_info in enhanced_deps.get("method_calls", []):
+            yield f"\nFile: {method_call_info['file']}\nMethod calls: {', '.join(method_call_info['calls'])}\n"
+        for import_info in enhanced_deps.get("import_dependencies", []):
+            yield f"\nFile: {import_info['file']}\nImports: {', '.join(import_info['imports'])}\n"
+
+    if "dependency_chains" in related_code:
+        yield "\nDetailed Dependency Chains:\n"
+        for chain in related_code["dependency_chains"]:
+            yield f"\nFile: {chain['file_path']}\nDependent Files:\n"
+            for dep in chain.get("dependent_files", []):
+                yield f"- {dep['file_path']}\n"
+                yield from (f"  - Method {method['name']}: {method['summary']}\n" for method in dep.get("methods", []))
+
+    if "dependency_visualization" in related_code:
+        yield "\nDependency Flow:\n"
+        yield from (f"- {viz}\n" for viz in related_code["dependency_visualization"])
+
+def _iter_similar_code_lines(related_code: Dict[str, Any]) -> Iterator[str]:
+    """Yield the similar code section of the impact prompt"""
+    yield "\nSimilar Code Analysis:\n"
+    if "similar_code" not in related_code:
+        return
+    similar = related_code["similar_code"]
+    yield "\nSimilar Files:\n"
+    for file in similar.get("files", []):
+        yield f"- {file['path']} (similarity: {file['similarity']:.2f})\n"
+        yield from (f"  - Method: {method.get('name', 'unknown')}\n" for method in file.get("methods", []))
+    yield "\nSimilar Methods:\n"
+    yield from (
+        f"- {method['name']} in {method.get('file_path', 'unknown')} (similarity: {method['similarity']:.2f})\n"
+        for method in similar.get("methods", [])
+    )
+
+class AzureOpenAIService:
+    def __init__(self):
+        self.client = AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+        )
+        self.deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+        self.embeddings_deployment = os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT_NAME")
+        self._embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+        self._analysis_cache = LRUCache(ANALYSIS_CACHE_SIZE)
+        # Optional on-disk embedding cache that survives restarts and is shared between workers
+        embedding_cache_db = os.getenv("EMBEDDING_CACHE_DB")
+        self._embedding_store = SqliteCache(embedding_cache_db) if embedding_cache_db else None
+        self.change_summary_service = ChangeSummaryService()
+        self.method_extractor = MethodExtractor()
+        # Bound the number of embedding requests in flight at once
+        self._embedding_semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+        # Single-text embedding requests waiting to be coalesced into one batch
+        self._pending_embeddings: List[Tuple[str, str, asyncio.Future]] = []
+        # Embeddings being requested right now, by cache key, so concurrent callers share one request
+        self._inflight_embeddings: Dict[str, asyncio.Future] = {}
+        self._embedding_flush_handle: Optional[asyncio.TimerHandle] = None
+        self._embedding_tasks = set()
+
+    def _get_cached_prompt_template(self, analysis_type: str) -> str:
+        """Get prompt templates for different analysis types"""
+        return _PROMPT_TEMPLATES.get(analysis_type, _PROMPT_TEMPLATES["impact_analysis"])
+    async def get_embeddings(self, text: str) -> List[float]:
+        """Get embeddings for text using Azure OpenAI"""
+        # Check cache first
+        text_hash = self._embedding_key(text)
+        embedding = (await self._get_cached_embeddings([text_hash]))[0]
+        if embedding is not None:
+            return embedding
+        
+        # Shield the shared future so one caller's cancellation does not fail the others
+        return await asyncio.shield(self._queue_embedding(text_hash, text))
+    
+    def _queue_embedding(self, key: str, text: str) -> asyncio.Future:
+        """Join a request already in flight for this text, or queue the text so
+        concurrent callers share one embeddings request"""
+        future = self._inflight_embeddings.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight_embeddings[key] = future
+            self._pending_embeddings.append((key, text, future))
+            if len(self._pending_embeddings) >= EMBEDDING_BATCH_SIZE:
+                self._flush_embeddings()
+            elif self._embedding_flush_handle is None:
+                self._embedding_flush_handle = loop.call_later(EMBEDDING_COALESCE_DELAY, self._flush_embeddings)
+        return future
+    
+    def _flush_embeddings(self):
+        """Dispatch all queued texts as a single embeddings request"""
+        if self._embedding_flush_handle is not None:
+            self._embedding_flush_handle.cancel()
+            self._embedding_flush_handle = None
+        
+        batch, self._pending_embeddings = self._pending_embeddings, []
+        if batch:
+            task = asyncio.create_task(self._embed_pending(batch))
+            # Hold a reference until the request finishes
+            self._embedding_tasks.add(task)
+            task.add_done_callback(self._embedding_tasks.discard)
+    
+    async def _embed_pending(self, batch: List[Tuple[str, str, asyncio.Future]]):
+        """Resolve queued embedding futures from one embeddings request"""
+        try:
+            async with self._embedding_semaphore:
+                response = await self.client.embeddings.create(
+                    model=self.embeddings_deployment,
+                    input=[text for _, text, _ in batch]
+                )
+            embeddings = [embedding_data.embedding for embedding_data in response.data]
+            
+            # Cache the results, answering callers before the slower disk write
+            vectors = self._cache_embeddings([(key, embedding) for (key, _, _), embedding in zip(batch, embeddings)])
+            for (_, _, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+            await self._persist_embeddings(vectors)
+        except BadRequestError as e:
+            if len(batch) == 1:
+                logger.error("Error generating embedding: %s", e)
+                if not batch[0][2].done():
+                    batch[0][2].set_exception(e)
+                return
+            # Batches mix texts from unrelated callers, so retry each text on its own
+            # to fail only the caller whose input was rejected
+            logger.warning("Embeddings batch rejected, retrying %d texts individually: %s", len(batch), e)
+            await asyncio.gather(*(self._embed_pending([item]) for item in batch))
+        except Exception as e:
+            logger.error("Error generating embedding: %s", e, exc_info=True)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, _, future in batch:
+                if self._inflight_embeddings.get(key) is future:
+                    del self._inflight_embeddings[key]
+                # Cancelled mid-request (e.g. on shutdown), so release the waiting callers
+                if not future.done():
+                    future.cancel()
+
+    def _embedding_key(self, text: str) -> str:
+        """Cache key for an embedding, scoped to the embeddings deployment that produced it"""
+        return stable_hash(f"{self.embeddings_deployment}\x00{text}")
+
+    async def _get_cached_embeddings(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings in memory, then any misses in the persistent cache if enabled,
+        reading the disk once per call off the event loop"""
+        vectors = [self._embedding_cache.get(key) for key in keys]
+        
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing and self._embedding_store is not None:
+            try:
+                stored = await asyncio.to_thread(self._embedding_store.get_many, missing)
+            except sqlite3.Error as e:
+                logger.warning("Error reading embedding cache: %s", e)
+                stored = {}
+            for i, key in enumerate(keys):
+                if vectors[i] is None and key in stored:
+                    vector = array('f')
+                    vector.frombytes(stored[key])
+                    self._embedding_cache[key] = vector
+                    vectors[i] = vector
+        
+        return [vector.tolist() if vector is not None else None for vector in vectors]
+    
+    def _cache_embeddings(self, entries: List[Tuple[str, List[float]]]) -> List[Tuple[str, array]]:
+        """Store embeddings in memory, returning them packed for the persistent cache"""
+        # Packed float32 arrays take ~6 KB per 1536-dim vector instead of ~50 KB as a list of floats
+        vectors = [(key, array('f', embedding)) for key, embedding in entries]
+        for key, vector in vectors:
+            self._embedding_cache[key] = vector
+        return vectors
+    
+    async def _persist_embeddings(self, vectors: List[Tuple[str, array]]):
+        """Write packed embeddings to the persistent cache if enabled, off the event loop"""
+        if self._embedding_store is None or not vectors:
+            return
+        try:
+            await asyncio.to_thread(self._embedding_store.set_many, [(key, vector.tobytes()) for key, vector in vectors])
+        except sqlite3.Error as e:
+            logger.warning("Error writing embedding cache: %s", e)
+
+    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for multiple texts in batch"""
+        # Result positions for each uncached text, so duplicates are embedded once
+        pending_indices: Dict[str, List[int]] = {}
+        futures: Dict[str, asyncio.Future] = {}
+        
+        # Check cache for each text
+        keys = [self._embedding_key(text) for text in texts]
+        results = await self._get_cached_embeddings(keys)
+        for i, (text, key, embedding) in enumerate(zip(texts, keys, results)):
+            if embedding is not None:
+                continue
+            if key not in pending_indices:
+                pending_indices[key] = []
+                # Queued texts are sent in full batches, sharing the last one with concurrent callers
+                futures[key] = self._queue_embedding(key, text)
+            pending_indices[key].append(i)
+        
+        # Every text was cached, so skip the API round trip
+        if not futures:
+            return results
+        
+        embeddings = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        for key, embedding in zip(futures, embeddings):
+            for i in pending_indices[key]:
+                results[i] = embedding
+        
+        return results
+
+    def _extract_and_classify(self, change: CodeChange) -> Tuple[Dict[str, str], List[str]]:
+        """Extract a file's methods once, returning their code by normalized name and the changed method names"""
+        content = change.content or ''
+        try:
+            method_infos = self.method_extractor.extract_methods_from_content(content, change.file_path)
+        except Exception as e:
+            logger.error("Error extracting methods from %s: %s", change.file_path, e, exc_info=True)
+            method_infos = []
+        
+        # Normalize method names for robust matching
+        methods_by_name = {
+            _normalize_name(method_info.name): self.method_extractor.get_method_content(content, method_info)
+            for method_info in method_infos
+        }
+        
+        if change.diff:
+            # Use change summary service to identify methods from diff
+            changed_methods = self.change_summary_service.identify_methods_from_diff(
+                change.diff, change.file_path
+            )
+        elif change.content:
+            # For full content, all methods are assumed to be changed
+            changed_methods = [method_info.name for method_info in method_infos]
+        else:
+            changed_methods = []
+        
+        return methods_by_name, changed_methods
+
+    def _optimize_prompt_content(self, content: str, max_tokens: int = 6000) -> str:
+        """Optimize content for prompt to stay within token limits"""
+        encoding = _get_encoding()
+        if encoding is None:
+            return self._optimize_prompt_content_by_chars(content, max_tokens)
+        
+        tokens = encoding.encode(content, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return content
+        
+        # Prioritize keeping method definitions and important sections
+        important_lines, regular_lines = self._split_important_lines(content)
+        
+        # Give important lines up to 60% of the budget; whatever they leave goes to regular lines
+        important_tokens = encoding.encode('\n'.join(important_lines), disallowed_special=())
+        important_budget = int(max_tokens * 0.6)
+        if len(important_tokens) > important_budget:
+            result = encoding.decode(important_tokens[:important_budget]) + '\n... (content truncated)'
+            remaining_tokens = max_tokens - important_budget
+        else:
+            result = encoding.decode(important_tokens)
+            remaining_tokens = max_tokens - len(important_tokens)
+        
+        regular_tokens = encoding.encode('\n'.join(regular_lines), disallowed_special=())
+        if len(regular_tokens) <= remaining_tokens:
+            result += '\n' + encoding.decode(regular_tokens)
+        else:
+            result += '\n' + encoding.decode(regular_tokens[:remaining_tokens]) + '\n... (content truncated)'
+        
+        return result
+    
+    def _split_important_lines(self, content: str) -> Tuple[List[str], List[str]]:
+        """Split content into definition/import lines and all other lines"""
+        important_lines = []
+        regular_lines = []
+        
+        for line in content.split('\n'):
+            (important_lines if _IMPORTANT_LINE.search(line) else regular_lines).append(line)
+        
+        return important_lines, regular_lines
+    
+    def _optimize_prompt_content_by_chars(self, content: str, max_tokens: int) -> str:
+        """Optimize content using a character estimate when no tokenizer is available"""
+        if len(content) <= max_tokens * 4:  # Rough estimate: 1 token ≈ 4 characters
+            return content
+        
+        # Prioritize keeping method definitions and important sections
+        important_lines, regular_lines = self._split_important_lines(content)
+        
+        # Start with important lines
+        result = '\n'.join(important_lines)
+        
+        # Add regular lines until we reach the limit
+        remaining_space = max_tokens * 4 - len(result)
+        if remaining_space > 0:
+            additional_content = '\n'.join(regular_lines)
+            if len(additional_content) <= remaining_space:
+                result += '\n' + additional_content
+            else:
+                result += '\n' + additional_content[:remaining_space] + '\n... (content truncated)'
+        
+        return result
+    def _analysis_cache_key(self, changes: List[CodeChange], related_code: Dict[str, Any]) -> str:
+        """Get an order-independent cache key for an impact analysis request"""
+        canonical = {
+            "changes": [
+                {
+                    "path": change.file_path,
+                    "type": change.change_type,
+                    "diff": stable_hash(change.diff or ''),
+                    "content": stable_hash(change.content or '')
+                }
+                for change in sorted(changes, key=lambda change: change.file_path)
+            ],
+            "related_code": related_code
+        }
+        return stable_hash(orjson.dumps(canonical, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+
+    async def _build_impact_prompt(self, changes: List[CodeChange], related_code: Dict[str, Any]) -> str:
+        """Build the user prompt for impact analysis"""
+        # Detect UI components
+        is_ui_change = any(change.file_path.endswith(_UI_EXTS) for change in changes)
+        
+        # Format changes into a readable structure
+        formatted_changes = []
+        for change in changes:
+            change_parts = [f"\nFile: {change.file_path}\n", f"Type: {change.change_type}\n"]
+            if change.diff:
+                change_parts.append(f"Diff:\n{change.diff}\n")
+            elif change.content:
+                # Optimize content for prompt
+                optimized_content = self._optimize_prompt_content(change.content)
+                change_parts.append(f"Content:\n{optimized_content}\n")
+            formatted_changes.append(''.join(change_parts))
+
+        # Add UI-specific context if needed
+        ui_context = _UI_CONTEXT if is_ui_change else ""
+
+        # Format dependency and similar code information
+        dependencies_text = ''.join(_iter_dependency_lines(related_code))
+        similar_code_text = ''.join(_iter_similar_code_lines(related_code))
+
+        # --- Functional Diff Summaries ---
+        # Build a map of file_path -> {method_name: summary}
+        async def summarize(change: CodeChange):
+            # We don't have base code in this context
+            change_analysis = await asyncio.to_thread(
+                self.change_summary_service.analyze_file_changes,
+                change.file_path, '', change.content
+            )
+            
+            # Create summaries for each method
+            method_summaries = {}
+            for method_change in change_analysis.get('method_changes', []):
+                method_summaries[method_change['method_name']] = method_change['summary']
+            return change.file_path, method_summaries
+        
+        # Generate change analysis for all files with content concurrently
+        functional_summaries = dict(await asyncio.gather(
+            *(summarize(change) for change in changes if change.content)
+        ))
+        # --- End Functional Diff Summaries ---
+
+        # When building the LLM prompt, include the functional summaries for each changed/impacted method
+        # Instead of sending full code or raw diff, send the summary
+        # Example: Add to the prompt for each changed method:
+        # "Functional change summary for {file_path}.{method_name}: {summary}"
+        # You can concatenate these summaries and add to the prompt before the rest of the context
+        diff_summaries_text = ''.join(
+            f"\nFunctional change summary for {file_path}.{method_name}:\n{summary}\n"
+            for file_path, methods in functional_summaries.items()
+            for method_name, summary in methods.items()
+        )
+
+        # Prepare the prompt
+        prompt_template = self._get_cached_prompt_template("impact_analysis")
+        return prompt_template.format(
+            changes=''.join(formatted_changes),
+            ui_context=ui_context,
+            dependencies=dependencies_text,
+            similar_code=similar_code_text,
+            diff_summaries=diff_summaries_text
+        )
+
+    async def analyze_impact(self, changes: List[CodeChange], related_code: Dict[str, Any]) -> ChangeAnalysisResponseWithCode:
+        """Analyze the impact of code changes using Azure OpenAI and include full method code and impacted file content."""
+        # Check analysis cache before doing any prompt work
+        cache_key = self._analysis_cache_key(changes, related_code)
+        if cache_key in self._analysis_cache:
+            logger.debug("Using cached analysis result")
+            analysis_json = self._analysis_cache[cache_key]
+        else:
+            prompt = await self._build_impact_prompt(changes, related_code)
+            
+            # Get completion from Azure OpenAI
+            response = await self.client.chat.completions.create(
+                model=self.deployment_name,
+                messages=[
+                    {
+                        "role": "system", 
+                        "content": _SYSTEM_PROMPT
                     },
                     {"role": "user", "content": prompt}
                 ],
@@ -499,8 +694,8 @@ Rules:
             if not response_text:
                 raise Exception("Empty response from GPT")
                 
-            analysis_json = json.loads(response_text)
-            self._analysis_cache[prompt_hash] = analysis_json
+            analysis_json = orjson.loads(response_text)
+            self._analysis_cache[cache_key] = analysis_json
         
         try:
             # Validate required fields
@@ -510,15 +705,16 @@ Rules:
                 raise KeyError(f"Missing required fields: {', '.join(missing_fields)}")
             
             # After parsing the LLM response (analysis_json):
-            # 1. For each changed file, extract all methods and their code from uploaded content
+            # 1. For each changed file, extract all methods and their code from uploaded content,
+            #    and get the actual changed methods from diffs/content in the same pass
             file_method_map = {}
+            changed_methods_by_file = {}
             uploaded_content_map = {change.file_path: change.content or '' for change in changes}
             for change in changes:
-                file_path = change.file_path
-                file_content = change.content or ''
-                methods = self._extract_methods(file_content, file_path)
-                # Normalize method names for robust matching
-                file_method_map[file_path] = {normalize(m['name']): m['content'] for m in methods}
+                methods_by_name, changed_methods = self._extract_and_classify(change)
+                file_method_map[change.file_path] = methods_by_name
+                if changed_methods:
+                    changed_methods_by_file[change.file_path] = changed_methods
             # 2. Build changed_components with robust method code matching
             changed_components = []
             for comp in analysis_json["changed_components"]:
@@ -552,8 +748,6 @@ Rules:
                     associated_unit_tests=comp["associated_unit_tests"],
                     file_summary=comp.get("file_summary", "File has been modified")
                 ))
-            # Get the actual changed methods from diffs/content
-            changed_methods_by_file = self._identify_changed_methods_from_diff(changes)
             # 3. For dependency_chains, add full file content to each impacted file
             dependency_chains = []
             for chain in (analysis_json.get("dependency_chains") or []):
@@ -587,7 +781,7 @@ Rules:
             )
 
         except json.JSONDecodeError as e:
-            print(f"Raw GPT response: {response_text if 'response_text' in locals() else 'No response'}")
+            logger.error("Raw GPT response: %s", response_text if 'response_text' in locals() else 'No response')
             raise Exception(f"Failed to parse GPT response as JSON: {str(e)}")
         except KeyError as e:
             raise Exception(f"Missing required field in GPT response: {str(e)}")
@@ -597,47 +791,12 @@ Rules:
     async def generate_test_cases(self, prompt: str) -> Dict[str, Any]:
         """Generate test cases using Azure OpenAI"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.deployment_name,
                 messages=[
                     {
                         "role": "system",
-                        "content": """You are a test case generation expert. Generate comprehensive test cases based on code analysis.
-                        
-Your response must be ONLY a valid JSON object with the following structure:
-{
-    "test_cases": [
-        {
-            "title": "Test case title",
-            "description": "Detailed description of what this test validates",
-            "category": "API|UI|Integration",
-            "priority": "Critical|High|Medium|Low",
-            "test_steps": [
-                {
-                    "step_number": 1,
-                    "action": "Action to perform",
-                    "expected_result": "Expected outcome",
-                    "test_data": "Required test data (optional)"
-                }
-            ],
-            "preconditions": "Prerequisites for running this test",
-            "test_data_requirements": ["data1", "data2"],
-            "automation_feasibility": "High|Medium|Low|Manual Only",
-            "estimated_duration": 15,
-            "tags": ["regression", "api", "critical"],
-            "related_code_files": ["file1.cs", "file2.cs"]
-        }
-    ]
-}
-
-Rules:
-1. Generate test cases that cover both positive and negative scenarios
-2. Focus on edge cases and boundary conditions
-3. Consider the risk level and prioritize accordingly
-4. Include specific, actionable test steps
-5. Suggest realistic automation feasibility
-6. Include relevant tags for test organization
-7. Map tests to the specific code files they validate"""
+                        "content": _TEST_GENERATION_SYSTEM_PROMPT
                     },
                     {"role": "user", "content": prompt}
                 ],
@@ -650,7 +809,7 @@ Rules:
             if not response_text:
                 raise Exception("Empty response from GPT for test generation")
             
-            return json.loads(response_text)
+            return orjson.loads(response_text)
             
         except json.JSONDecodeError as e:
             raise Exception(f"Failed to parse test generation response as JSON: {str(e)}")
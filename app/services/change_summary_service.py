@@ -1,10 +1,33 @@
 import ast
 import re
+import threading
+from bisect import bisect_right
+from collections import Counter
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from .method_extractor import MethodExtractor, MethodInfo
+from ..utils.cache_utils import LRUCache, stable_hash
 
-@dataclass
+# Maximum number of file versions whose extracted methods are kept
+METHODS_CACHE_SIZE = 128
+# Impact levels ranked by severity, so the most severe can be taken with max()
+_LOW, _MEDIUM, _HIGH = 1, 2, 3
+_IMPACT_NAMES = {_LOW: 'low', _MEDIUM: 'medium', _HIGH: 'high'}
+_IMPACT_RANKS = {name: rank for rank, name in _IMPACT_NAMES.items()}
+
+# Unified diff hunk header, capturing the first line number of the new version
+_HUNK_RE = re.compile(r'@@\s*-\d+,?\d*\s*\+(\d+),?\d*\s*@@')
+# Code patterns compared between the old and new versions of a method
+_CALL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\(')
+_IMPORT_RES = (
+    re.compile(r'import\s+([a-zA-Z_][a-zA-Z0-9_.]*)'),
+    re.compile(r'from\s+([a-zA-Z_][a-zA-Z0-9_.]*)\s+import'),
+)
+_CONDITIONAL_RE = re.compile(r'\b(?:if|elif|else)\b')
+_LOOP_RE = re.compile(r'\b(?:for|while)\b')
+_EXCEPTION_RE = re.compile(r'\b(?:try|except|finally|raise)\b')
+
+@dataclass(slots=True)
 class MethodChange:
     method_name: str
     change_type: str  # 'added', 'removed', 'modified'
@@ -17,6 +40,10 @@ class ChangeSummaryService:
     
     def __init__(self):
         self.method_extractor = MethodExtractor()
+        # Extracted methods by file path and content digest; the lock guards
+        # the cache because analyses run in worker threads
+        self._methods_cache = LRUCache(METHODS_CACHE_SIZE)
+        self._methods_cache_lock = threading.Lock()
         
     def analyze_file_changes(self, file_path: str, old_content: str = "", new_content: str = "") -> Dict[str, Any]:
         """Analyze changes in a file and generate comprehensive summary"""
@@ -27,44 +54,69 @@ class ChangeSummaryService:
         
         # Identify changes
         method_changes = self._identify_method_changes(old_methods, new_methods)
+        change_counts = Counter(mc.change_type for mc in method_changes)
         
         # Generate file-level summary
-        file_summary = self._generate_file_summary(file_path, method_changes, old_content, new_content)
+        file_summary = self._generate_file_summary(file_path, method_changes, change_counts)
         
         return {
             "file_path": file_path,
             "summary": file_summary,
             "method_changes": [self._method_change_to_dict(mc) for mc in method_changes],
-            "total_methods_changed": len([mc for mc in method_changes if mc.change_type == 'modified']),
-            "methods_added": len([mc for mc in method_changes if mc.change_type == 'added']),
-            "methods_removed": len([mc for mc in method_changes if mc.change_type == 'removed']),
+            "total_methods_changed": change_counts['modified'],
+            "methods_added": change_counts['added'],
+            "methods_removed": change_counts['removed'],
             "overall_impact": self._assess_overall_impact(method_changes)
         }
     
+    def _extract_methods(self, content: str, file_path: str) -> List[MethodInfo]:
+        """Extract methods from content, reusing results for content seen before"""
+        key = (file_path, stable_hash(content))
+        with self._methods_cache_lock:
+            methods = self._methods_cache.get(key)
+        if methods is None:
+            methods = self.method_extractor.extract_methods_from_content(content, file_path)
+            with self._methods_cache_lock:
+                self._methods_cache[key] = methods
+        return methods
+    
     def _get_methods_dict(self, content: str, file_path: str) -> Dict[str, MethodInfo]:
         """Extract methods and return as dictionary"""
-        methods = self.method_extractor.extract_methods_from_content(content, file_path)
+        methods = self._extract_methods(content, file_path)
         return {method.name: method for method in methods}
     
     def _identify_method_changes(self, old_methods: Dict[str, MethodInfo], new_methods: Dict[str, MethodInfo]) -> List[MethodChange]:
         """Identify what changed between method versions"""
-        changes = []
-        
-        # Find added methods
-        for name, method_info in new_methods.items():
-            if name not in old_methods:
-                changes.append(MethodChange(
+        added = []
+        modified = []
+        
+        # Find added and modified methods with a single lookup per new method
+        for name, new_method in new_methods.items():
+            old_method = old_methods.get(name)
+            if old_method is None:
+                added.append(MethodChange(
                     method_name=name,
                     change_type='added',
                     summary=f"New method '{name}' added",
                     impact_level='medium',
-                    details=[f"Added {method_info.signature}"]
+                    details=[f"Added {new_method.signature}"]
                 ))
+            elif old_method.signature != new_method.signature:
+                change_details = self._analyze_method_modification(old_method, new_method)
+                if change_details:
+                    modified.append(MethodChange(
+                        method_name=name,
+                        change_type='modified',
+                        summary=change_details['summary'],
+                        impact_level=change_details['impact_level'],
+                        details=change_details['details']
+                    ))
         
         # Find removed methods
+        removed = []
         for name, method_info in old_methods.items():
             if name not in new_methods:
-                changes.append(MethodChange(
+                removed.append(MethodChange(
                     method_name=name,
                     change_type='removed',
                     summary=f"Method '{name}' removed",
@@ -72,33 +124,17 @@ class ChangeSummaryService:
                     details=[f"Removed {method_info.signature}"]
                 ))
         
-        # Find modified methods
-        for name in set(old_methods.keys()) & set(new_methods.keys()):
-            old_method = old_methods[name]
-            new_method = new_methods[name]
-            
-            if old_method.signature != new_method.signature:
-                change_details = self._analyze_method_modification(old_method, new_method)
-                if change_details:
-                    changes.append(MethodChange(
-                        method_name=name,
-                        change_type='modified',
-                        summary=change_details['summary'],
-                        impact_level=change_details['impact_level'],
-                        details=change_details['details']
-                    ))
-        
-        return changes
+        return added + removed + modified
     
     def _analyze_method_modification(self, old_method: MethodInfo, new_method: MethodInfo) -> Optional[Dict[str, Any]]:
         """Analyze what specifically changed in a method"""
         details = []
-        impact_level = 'low'
+        impact = _LOW
         
         # Check signature changes
         if old_method.signature != new_method.signature:
             details.append(f"Signature changed from '{old_method.signature}' to '{new_method.signature}'")
-            impact_level = 'high'  # Signature changes are usually breaking
+            impact = _HIGH  # Signature changes are usually breaking
         
         # Check async changes
         if old_method.is_async != new_method.is_async:
@@ -106,7 +142,7 @@ class ChangeSummaryService:
                 details.append("Method converted to async")
             else:
                 details.append("Method converted from async to sync")
-            impact_level = 'high'
+            impact = _HIGH
         
         # Check static/class method changes
         if old_method.is_static != new_method.is_static:
@@ -114,14 +150,14 @@ class ChangeSummaryService:
                 details.append("Method converted to static")
             else:
                 details.append("Method converted from static to instance")
-            impact_level = 'medium'
+            impact = max(impact, _MEDIUM)
         
         if old_method.is_class_method != new_method.is_class_method:
             if new_method.is_class_method:
                 details.append("Method converted to class method")
             else:
                 details.append("Method converted from class method")
-            impact_level = 'medium'
+            impact = max(impact, _MEDIUM)
         
         # Check docstring changes
         if old_method.docstring != new_method.docstring:
@@ -131,7 +167,6 @@ class ChangeSummaryService:
                 details.append("Documentation removed")
             else:
                 details.append("Documentation updated")
-            impact_level = max(impact_level, 'low')
         
         if not details:
             return None
@@ -142,18 +177,18 @@ class ChangeSummaryService:
         
         return {
             'summary': summary,
-            'impact_level': impact_level,
+            'impact_level': _IMPACT_NAMES[impact],
             'details': details
         }
     
-    def _generate_file_summary(self, file_path: str, method_changes: List[MethodChange], old_content: str, new_content: str) -> str:
-        """Generate a high-level summary of file changes"""
+    def _generate_file_summary(self, file_path: str, method_changes: List[MethodChange], change_counts: Counter) -> str:
+        """Generate a high-level summary of file changes from the per-type change counts"""
         if not method_changes:
             return f"No method-level changes detected in {file_path}"
         
-        added = len([mc for mc in method_changes if mc.change_type == 'added'])
-        removed = len([mc for mc in method_changes if mc.change_type == 'removed'])
-        modified = len([mc for mc in method_changes if mc.change_type == 'modified'])
+        added = change_counts['added']
+        removed = change_counts['removed']
+        modified = change_counts['modified']
         
         summary_parts = []
         
@@ -167,9 +202,9 @@ class ChangeSummaryService:
         base_summary = f"File {file_path}: {', '.join(summary_parts)}"
         
         # Add context about the type of changes
-        high_impact_changes = [mc for mc in method_changes if mc.impact_level == 'high']
-        if high_impact_changes:
-            base_summary += f". {len(high_impact_changes)} high-impact change{'s' if len(high_impact_changes) > 1 else ''} detected"
+        high_impact = sum(1 for mc in method_changes if mc.impact_level == 'high')
+        if high_impact:
+            base_summary += f". {high_impact} high-impact change{'s' if high_impact > 1 else ''} detected"
         
         return base_summary
     
@@ -178,15 +213,13 @@ class ChangeSummaryService:
         if not method_changes:
             return 'none'
         
-        impact_scores = {'low': 1, 'medium': 2, 'high': 3}
-        max_impact = max(impact_scores.get(mc.impact_level, 1) for mc in method_changes)
+        max_impact = max(_IMPACT_RANKS.get(mc.impact_level, _LOW) for mc in method_changes)
         
         # Consider the number of changes
         if len(method_changes) > 5:
-            max_impact = min(max_impact + 1, 3)
+            max_impact = min(max_impact + 1, _HIGH)
         
-        impact_levels = {1: 'low', 2: 'medium', 3: 'high'}
-        return impact_levels[max_impact]
+        return _IMPACT_NAMES[max_impact]
     
     def _method_change_to_dict(self, method_change: MethodChange) -> Dict[str, Any]:
         """Convert MethodChange to dictionary"""
@@ -230,7 +263,7 @@ class ChangeSummaryService:
     def identify_method_containing_change(self, content: str, change_line_number: int, file_path: str = "") -> str:
         """Identify the method name that contains a specific line change"""
         try:
-            methods = self.method_extractor.extract_methods_from_content(content, file_path)
+            methods = self._extract_methods(content, file_path)
             
             # Find the method that contains the change line
             for method in methods:
@@ -255,36 +288,54 @@ class ChangeSummaryService:
             # Parse the diff to find changed lines
             lines = diff_content.split('\n')
             changed_line_numbers = []
+            add_changed_line = changed_line_numbers.append
             current_line_number = 0
             
             for line in lines:
-                if line.startswith('@@'):
+                # Dispatch on the first character; most lines are context lines
+                first = line[:1]
+                if first == '@' and line.startswith('@@'):
                     # Parse hunk header to get line numbers
-                    import re
-                    match = re.search(r'@@\s*-\d+,?\d*\s*\+(\d+),?\d*\s*@@', line)
+                    match = _HUNK_RE.search(line)
                     if match:
                         current_line_number = int(match.group(1))
-                elif line.startswith('+') and not line.startswith('+++'):
+                elif first == '+' and not line.startswith('+++'):
                     # This is an added line
-                    changed_line_numbers.append(current_line_number)
+                    add_changed_line(current_line_number)
                     current_line_number += 1
-                elif line.startswith('-') and not line.startswith('---'):
-                    # This is a removed line, don't increment line number
-                    continue
-                elif not line.startswith('-'):
-                    # Context line
+                elif first != '-':
+                    # Context line; removed lines and '---' headers don't increment line number
                     current_line_number += 1
             
             # Extract the new content from diff
             from ..utils.diff_utils import extract_file_content_from_diff
             new_content = extract_file_content_from_diff(diff_content)
             
-            # Find methods containing the changed lines
+            # Line ranges of the new version's methods, sorted by start line and
+            # tagged with extraction order
+            intervals = []
+            for order, method in enumerate(self._extract_methods(new_content, file_path)):
+                method_lines = self.method_extractor.get_method_content(new_content, method).split('\n')
+                intervals.append((method.start_line, method.start_line + len(method_lines) - 1, order, method.name))
+            intervals.sort()
+            starts = [start for start, _, _, _ in intervals]
+            # Furthest end line among the methods starting at or before each position
+            max_ends = []
+            for _, end, _, _ in intervals:
+                max_ends.append(max(end, max_ends[-1]) if max_ends else end)
+            
+            # Find methods containing the changed lines; when ranges overlap, the
+            # first extracted method wins, as in identify_method_containing_change
             method_names = set()
             for line_num in changed_line_numbers:
-                method_name = self.identify_method_containing_change(new_content, line_num, file_path)
-                if method_name:
-                    method_names.add(method_name)
+                containing = None
+                i = bisect_right(starts, line_num) - 1
+                while i >= 0 and max_ends[i] >= line_num:
+                    if intervals[i][1] >= line_num and (containing is None or intervals[i][2] < containing[2]):
+                        containing = intervals[i]
+                    i -= 1
+                if containing:
+                    method_names.add(containing[3])
             
             return list(method_names)
             
@@ -300,14 +351,14 @@ class ChangeSummaryService:
         changes = []
         
         # Analyze structural changes
-        old_lines = [line.strip() for line in old_content.split('\n') if line.strip()]
-        new_lines = [line.strip() for line in new_content.split('\n') if line.strip()]
+        old_line_count = self._count_code_lines(old_content)
+        new_line_count = self._count_code_lines(new_content)
         
         # Check for added/removed lines
-        if len(new_lines) > len(old_lines):
-            changes.append(f"Added {len(new_lines) - len(old_lines)} lines of code")
-        elif len(new_lines) < len(old_lines):
-            changes.append(f"Removed {len(old_lines) - len(new_lines)} lines of code")
+        if new_line_count > old_line_count:
+            changes.append(f"Added {new_line_count - old_line_count} lines of code")
+        elif new_line_count < old_line_count:
+            changes.append(f"Removed {old_line_count - new_line_count} lines of code")
         
         # Check for specific patterns
         old_patterns = self._extract_code_patterns(old_content)
@@ -344,6 +395,10 @@ class ChangeSummaryService:
         
         return f"Method '{method_name}': {'; '.join(changes[:4])}"
     
+    def _count_code_lines(self, content: str) -> int:
+        """Count non-blank lines without building a list of stripped lines"""
+        return sum(1 for line in content.split('\n') if line and not line.isspace())
+    
     def _extract_code_patterns(self, content: str) -> Dict[str, set]:
         """Extract various code patterns for comparison"""
         patterns = {
@@ -355,25 +410,20 @@ class ChangeSummaryService:
         }
         
         # Function calls
-        call_pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
-        patterns['calls'].update(re.findall(call_pattern, content))
+        patterns['calls'].update(_CALL_RE.findall(content))
         
         # Import statements
-        import_patterns = [
-            r'import\s+([a-zA-Z_][a-zA-Z0-9_.]*)',
-            r'from\s+([a-zA-Z_][a-zA-Z0-9_.]*)\s+import'
-        ]
-        for pattern in import_patterns:
-            patterns['imports'].update(re.findall(pattern, content))
+        for pattern in _IMPORT_RES:
+            patterns['imports'].update(pattern.findall(content))
         
         # Control flow
-        if re.search(r'\bif\b|\belif\b|\belse\b', content):
+        if _CONDITIONAL_RE.search(content):
             patterns['conditionals'].add('conditional')
         
-        if re.search(r'\bfor\b|\bwhile\b', content):
+        if _LOOP_RE.search(content):
             patterns['loops'].add('loop')
         
-        if re.search(r'\btry\b|\bexcept\b|\bfinally\b|\braise\b', content):
+        if _EXCEPTION_RE.search(content):
             patterns['exceptions'].add('exception_handling')
         
         # Remove common keywords that aren't actual function calls
@@ -3,7 +3,7 @@ import re
 from typing import List, Dict, Optional, Set
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class MethodInfo:
     name: str
     start_line: int
@@ -60,12 +60,13 @@ class MethodExtractor:
             lines = content.split('\n')
             
             for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    # Skip if it's a nested function (not top-level or class method)
-                    if self._is_top_level_or_class_method(node, tree):
-                        method_info = self._create_python_method_info(node, lines)
-                        if method_info:
-                            methods.append(method_info)
+                # Only top-level functions and class methods, not nested functions
+                if isinstance(node, (ast.ClassDef, ast.Module)):
+                    for child in node.body:
+                        if isinstance(child, ast.FunctionDef):
+                            method_info = self._create_python_method_info(child, lines)
+                            if method_info:
+                                methods.append(method_info)
             
             return methods
             
@@ -73,14 +74,6 @@ class MethodExtractor:
             # Fallback to regex for invalid Python syntax
             return self._extract_python_methods_regex(content)
 
-    def _is_top_level_or_class_method(self, func_node: ast.FunctionDef, tree: ast.AST) -> bool:
-        """Check if function is top-level or a class method (not nested)"""
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.ClassDef, ast.Module)):
-                if func_node in node.body:
-                    return True
-        return False
-
     def _create_python_method_info(self, node: ast.FunctionDef, lines: List[str]) -> Optional[MethodInfo]:
         """Create MethodInfo from AST FunctionDef node"""
         try:
@@ -2,28 +2,130 @@ import os
 import zipfile
 import tempfile
 import asyncio
+import codecs
 import json
-import hashlib
-from typing import Dict, Any, List, Tuple
+import re
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
 from supabase import create_client, Client
 from fastapi import UploadFile
 from ..models.analysis import IndexingResult, CodeChange
 from ..services.azure_openai_service import AzureOpenAIService
+from ..utils.cache_utils import LRUCache, stable_hash
+from ..utils.error_handling import RAGServiceError, EmbeddingError, VectorSearchError, DependencyAnalysisError
+
+# Maximum number of embeddings kept in memory by content hash
+RAG_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "10000"))
+# Embed each file on its own instead of one embeddings request per indexing batch
+RAG_DISABLE_EMBED_BATCHING = os.getenv("RAG_DISABLE_EMBED_BATCHING", "false").lower() == "true"
+# Number of indexing batches processed concurrently; each holds up to batch_size files'
+# contents and embeddings in memory
+RAG_INDEX_WORKERS = max(1, int(os.getenv("RAG_INDEX_WORKERS", "1")))
+# Worker processes that read indexed files and extract their methods (0 reads them in a thread instead)
+RAG_EXTRACT_PROCESSES = max(0, int(os.getenv("RAG_EXTRACT_PROCESSES", "2")))
+# Size of each read when copying an uploaded repository zip to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+# Encodings tried in order when reading a file for indexing
+_FILE_ENCODINGS = ('utf-8', 'utf-16', 'latin1', 'cp1252')
+# Printable ASCII bytes, deleted to count the non-printable rest
+_PRINTABLE_ASCII = bytes(range(0x20, 0x7f))
+
+# Filename fragments that mark test files
+_TEST_FILE_PATTERNS = ('test.', '.test.', '.spec.', '.tests.', 'mock.', '.mock.', '.fixture.')
+# Binary, generated and large data file suffixes that are never indexed
+_SKIP_EXTENSIONS = (
+    # Binary files
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.svg',
+    '.woff', '.woff2', '.ttf', '.eot', '.otf',
+    '.mp4', '.mp3', '.wav', '.avi', '.mov',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.zip', '.rar', '.7z', '.tar', '.gz',
+    '.exe', '.dll', '.so', '.dylib',
+    # Generated files
+    '.min.js', '.min.css', '.map',
+    # Large data files
+    '.csv', '.dat', '.log', '.dump'
+)
+# Directory path fragments whose files are never indexed
+_SKIP_DIR_PATTERNS = (
+    'node_modules/', '/dist/', '/build/', '/bin/', '/obj/', '/vendor/', '/third_party/',
+    '/.git/', '/.vs/', '/.idea/',
+    '/wwwroot/fonts/', '/wwwroot/images/', '/wwwroot/css/', '/wwwroot/js/'
+)
+
+# Source file extensions whose methods are extracted into the indexed metadata
+METHOD_EXTENSIONS = ('.py', '.js', '.ts', '.cs', '.java', '.cpp', '.go')
+# Method definition patterns tried in order against each line: (pattern, name group, pattern type)
+_METHOD_PATTERNS = (
+    # Python functions: def methodName( - must not be preceded by assignment
+    (re.compile(r'^\s*def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*:'), 1, 'python_def'),
+    # Python async functions: async def methodName( - must not be preceded by assignment
+    (re.compile(r'^\s*async\s+def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*:'), 1, 'python_async_def'),
+    # JavaScript/TypeScript functions: function methodName(
+    (re.compile(r'^\s*(?:export\s+)?(?:async\s+)?function\s+([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\([^)]*\)'), 1, 'js_function'),
+    # JavaScript/TypeScript methods: methodName() {
+    (re.compile(r'^\s*(?:async\s+)?([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\([^)]*\)\s*\{'), 1, 'js_method'),
+    # C# methods: public/private returnType MethodName(
+    (re.compile(r'^\s*(?:public|private|protected|internal)\s+(?:static\s+)?(?:async\s+)?[a-zA-Z_<>[\]]+\s+([A-Z][a-zA-Z0-9_]*)\s*\([^)]*\)'), 1, 'csharp_method'),
+    # Java methods: public/private returnType methodName(
+    (re.compile(r'^\s*(?:public|private|protected)\s+(?:static\s+)?[a-zA-Z_<>[\]]+\s+([a-z][a-zA-Z0-9_]*)\s*\([^)]*\)'), 1, 'java_method'),
+)
+# All method patterns as one alternation, to reject most lines with a single search
+_ANY_METHOD_RE = re.compile('|'.join(f'(?:{pattern.pattern})' for pattern, _, _ in _METHOD_PATTERNS))
+# Keywords and built-ins that are never method names
+_METHOD_EXCLUDED_KEYWORDS = frozenset({
+    'if', 'for', 'while', 'def', 'class', 'return', 'import', 'from', 'try', 'except', 'with',
+    'function', 'var', 'let', 'const', 'new', 'this', 'super', 'static', 'public', 'private',
+    'protected', 'internal', 'async', 'await', 'yield', 'break', 'continue', 'switch', 'case'
+})
+# Assignment of a dict literal, e.g. "metrics = {"
+_DICT_ASSIGNMENT_RE = re.compile(r'^\s*[a-zA-Z_][a-zA-Z0-9_]*\s*=\s*{')
+# Patterns for the enhanced dependency analysis
+_CALL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\(')
+_IMPORT_RES = (
+    re.compile(r'from\s+([a-zA-Z_][a-zA-Z0-9_.]*)\s+import'),
+    re.compile(r'import\s+([a-zA-Z_][a-zA-Z0-9_.]*)'),
+)
+_ASSIGNMENT_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=')
+_PARAMS_RE = re.compile(r'def\s+[a-zA-Z_][a-zA-Z0-9_]*\s*\(([^)]*)\)')
 
 class RAGService:
-    def __init__(self):
+    def __init__(self, openai_service: Optional[AzureOpenAIService] = None):
         self.supabase: Client = create_client(
             os.getenv("SUPABASE_URL", ""),
             os.getenv("SUPABASE_KEY", "")
         )
-        self.openai_service = AzureOpenAIService()
+        # Share the application's client so embedding caches and batching are process-wide
+        self.openai_service = openai_service or AzureOpenAIService()
         self.batch_size = 15  # Optimized batch size
         self.skip_tests = True
-        self.cache = {}  # Simple in-memory cache for embeddings
+        self.cache = LRUCache(RAG_EMBEDDING_CACHE_SIZE)  # In-memory LRU cache for embeddings
+        # File reading and method extraction are CPU-bound, so they run in worker processes
+        # started on first use
+        self.cpu_pool: Optional[ProcessPoolExecutor] = None
+
+    def close(self):
+        """Stop the file processing workers"""
+        if self.cpu_pool is not None:
+            self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self.cpu_pool = None
+
+    def _get_cpu_pool(self) -> ProcessPoolExecutor:
+        """Get the file processing pool, starting it if needed"""
+        if self.cpu_pool is None:
+            # Spawn fresh interpreters rather than forking the running server with its threads and clients
+            self.cpu_pool = ProcessPoolExecutor(
+                max_workers=RAG_EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.cpu_pool
 
     def _get_file_hash(self, content: str) -> str:
         """Generate hash for file content to detect changes"""
-        return hashlib.md5(content.encode('utf-8')).hexdigest()
+        return stable_hash(content)
 
     async def _get_cached_embedding(self, content: str) -> List[float]:
         """Get embedding from cache or generate new one"""
@@ -34,9 +136,10 @@ class RAGService:
         
         # Check if embedding exists in database
         try:
-            result = self.supabase.table("code_embeddings").select("embedding").eq("content_hash", content_hash).limit(1).execute()
+            query = self.supabase.table("code_embeddings").select("embedding").eq("content_hash", content_hash).limit(1)
+            result = await asyncio.to_thread(query.execute)
             if result.data:
-                embedding = result.data[0]["embedding"]
+                embedding = self._parse_embedding(result.data[0]["embedding"])
                 self.cache[content_hash] = embedding
                 return embedding
         except Exception:
@@ -46,6 +149,49 @@ class RAGService:
         embedding = await self.openai_service.get_embeddings(content)
         self.cache[content_hash] = embedding
         return embedding
+
+    async def _get_cached_embeddings(self, contents: List[str]) -> List[List[float]]:
+        """Get embeddings for several contents, generating the uncached ones in one batch"""
+        content_hashes = [self._get_file_hash(content) for content in contents]
+        embeddings = [self.cache.get(content_hash) for content_hash in content_hashes]
+        
+        # Check which embeddings already exist in the database, in one query
+        missing_hashes = {content_hash for content_hash, embedding in zip(content_hashes, embeddings) if embedding is None}
+        if missing_hashes:
+            stored = {}
+            try:
+                query = self.supabase.table("code_embeddings").select("content_hash, embedding").in_("content_hash", list(missing_hashes))
+                result = await asyncio.to_thread(query.execute)
+                for row in result.data:
+                    stored.setdefault(row["content_hash"], self._parse_embedding(row["embedding"]))
+            except Exception:
+                pass
+            for i, content_hash in enumerate(content_hashes):
+                if embeddings[i] is None and content_hash in stored:
+                    embeddings[i] = stored[content_hash]
+                    self.cache[content_hash] = embeddings[i]
+        
+        # Generate the rest
+        uncached = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if uncached:
+            new_embeddings = await self.openai_service.get_embeddings_batch([contents[i] for i in uncached])
+            for i, embedding in zip(uncached, new_embeddings):
+                embeddings[i] = embedding
+                self.cache[content_hashes[i]] = embedding
+        
+        return embeddings
+
+    def _parse_embedding(self, embedding: Any) -> List[float]:
+        """Convert a stored embedding, which PostgREST returns as text for vector columns, to a list"""
+        return json.loads(embedding) if isinstance(embedding, str) else embedding
+
+    def _mean_embedding(self, embeddings: List[List[float]]) -> List[float]:
+        """Average several embeddings into one query vector"""
+        if len(embeddings) == 1:
+            return embeddings[0]
+        count = len(embeddings)
+        return [sum(values) / count for values in zip(*embeddings)]
+
     async def index_repository(self, file: UploadFile) -> IndexingResult:
         """Index repository code into Supabase vector store"""
         try:
@@ -53,55 +199,49 @@ class RAGService:
                 # Save and extract zip
                 zip_path = os.path.join(temp_dir, "repo.zip")
                 with open(zip_path, "wb") as f:
-                    content = await file.read()
-                    f.write(content)
+                    await asyncio.to_thread(shutil.copyfileobj, file.file, f, UPLOAD_CHUNK_SIZE)
 
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
+                await asyncio.to_thread(self._extract_zip, zip_path, temp_dir)
 
                 # Get all code files
-                code_files = []
-                for root, _, files in os.walk(temp_dir):
-                    for filename in files:
-                        if self._should_skip_file(filename, root):
-                            continue
-                        file_path = os.path.join(root, filename)
-                        try:
-                            # Quick check if file is readable and not empty
-                            if os.path.getsize(file_path) > 0:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    f.readline()  # Try reading first line
-                                code_files.append((file_path, os.path.relpath(file_path, temp_dir)))
-                        except (IOError, UnicodeDecodeError):
-                            continue
+                code_files = await asyncio.to_thread(self._collect_code_files, temp_dir)
 
                 total_files = len(code_files)
                 print(f"Found {total_files} code files to process...")
 
-                # Process files in batches
+                # Process files in batches, a bounded number at a time
                 indexed_files = 0
                 total_methods = 0
                 embedding_count = 0
-
-                for i in range(0, len(code_files), self.batch_size):
-                    batch = code_files[i:i + self.batch_size]
-                    results = await asyncio.gather(
-                        *[self._process_file(file_path, relative_path) 
-                          for file_path, relative_path in batch],
-                        return_exceptions=True
-                    )
-
-                    # Process results
-                    for result in results:
-                        if isinstance(result, Exception):
-                            print(f"Error processing file: {result}")
-                            continue
-                        if result:
-                            indexed_files += 1
-                            total_methods += result[0]
-                            embedding_count += result[1]
-
-                    print(f"Processed {indexed_files}/{total_files} files...")
+                batch_starts = iter(range(0, total_files, self.batch_size))
+
+                async def process_batches():
+                    nonlocal indexed_files, total_methods, embedding_count
+                    # Workers share the iterator, so each batch is taken exactly once
+                    for i in batch_starts:
+                        batch = code_files[i:i + self.batch_size]
+                        if RAG_DISABLE_EMBED_BATCHING:
+                            results = await asyncio.gather(
+                                *[self._process_file(file_path, relative_path) 
+                                  for file_path, relative_path in batch],
+                                return_exceptions=True
+                            )
+                        else:
+                            results = await self._process_file_batch(batch)
+
+                        # Process results
+                        for result in results:
+                            if isinstance(result, Exception):
+                                print(f"Error processing file: {result}")
+                                continue
+                            if result:
+                                indexed_files += 1
+                                total_methods += result[0]
+                                embedding_count += result[1]
+
+                        print(f"Processed {indexed_files}/{total_files} files...")
+
+                await asyncio.gather(*(process_batches() for _ in range(RAG_INDEX_WORKERS)))
 
                 return IndexingResult(
                     indexed_files=indexed_files,
@@ -109,138 +249,218 @@ class RAGService:
                     embedding_count=embedding_count
                 )
 
+        except RAGServiceError:
+            raise
         except Exception as e:
-            raise Exception(f"Failed to index repository: {str(e)}")
+            raise RAGServiceError(f"Failed to index repository: {str(e)}") from e
+
+    def _extract_zip(self, zip_path: str, target_dir: str):
+        """Extract a zip archive into a directory"""
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(target_dir)
+
+    def _collect_code_files(self, base_dir: str) -> List[Tuple[str, str]]:
+        """Walk a directory for readable, non-empty code files as (path, relative path) pairs"""
+        code_files = []
+        for root, dirs, files in os.walk(base_dir):
+            # Prune skipped directories in place so the walk never descends into them
+            dirs[:] = [d for d in dirs if not self._should_skip_dir(os.path.join(root, d))]
+            for filename in files:
+                if self._should_skip_file(filename):
+                    continue
+                file_path = os.path.join(root, filename)
+                try:
+                    # Quick check if file is readable and not empty
+                    if os.path.getsize(file_path) > 0:
+                        with open(file_path, 'r', encoding='utf-8') as f:
+                            f.readline()  # Try reading first line
+                        code_files.append((file_path, os.path.relpath(file_path, base_dir)))
+                except (IOError, UnicodeDecodeError):
+                    continue
+        return code_files
 
-    def _should_skip_file(self, filename: str, root: str) -> bool:
+    def _should_skip_dir(self, root: str) -> bool:
+        """Determine if every file in a directory should be skipped"""
+        normalized_path = root.replace('\\', '/').lower() + '/'
+        return any(pattern in normalized_path for pattern in _SKIP_DIR_PATTERNS)
+
+    def _should_skip_file(self, filename: str) -> bool:
         """Determine if a file should be skipped"""
         # Skip hidden files
         if filename.startswith('.'):
             return True
 
+        lower_name = filename.lower()
+        
         # Skip test files if configured, but be more precise
-        if self.skip_tests and any(pattern in filename.lower() for pattern in [
-            'test.', '.test.', '.spec.', '.tests.',
-            'mock.', '.mock.', '.fixture.'
-        ]):
+        if self.skip_tests and any(pattern in lower_name for pattern in _TEST_FILE_PATTERNS):
             return True
 
         # Skip binary and large files
-        skip_extensions = {
-            # Binary files
-            '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.svg',
-            '.woff', '.woff2', '.ttf', '.eot', '.otf',
-            '.mp4', '.mp3', '.wav', '.avi', '.mov',
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-            '.zip', '.rar', '.7z', '.tar', '.gz',
-            '.exe', '.dll', '.so', '.dylib',
-            # Generated files
-            '.min.js', '.min.css', '.map',
-            # Large data files
-            '.csv', '.dat', '.log', '.dump'
-        }
-        
-        if any(filename.lower().endswith(ext) for ext in skip_extensions):
-            return True
-
-        # Skip only specific binary and generated file patterns
-        skip_patterns = {
-            'node_modules/',
-            '/dist/',
-            '/build/',
-            '/bin/',
-            '/obj/',
-            '/vendor/',
-            '/third_party/',
-            '/.git/',
-            '/.vs/',
-            '/.idea/',
-            '/wwwroot/fonts/',
-            '/wwwroot/images/',
-            '/wwwroot/css/',
-            '/wwwroot/js/'
-        }
-        
-        normalized_path = root.replace('\\', '/').lower()
-        return any(pattern in normalized_path + '/' for pattern in skip_patterns)
+        return lower_name.endswith(_SKIP_EXTENSIONS)
 
     async def _process_file(self, file_path: str, relative_path: str) -> Tuple[int, int]:
         """Process a single file and return (methods_count, embeddings_count)"""
         try:
-            # Check file size (skip if too large)
-            file_size = os.path.getsize(file_path)
-            if file_size > 100 * 1024:  # Skip files larger than 100KB
-                print(f"Skipping large file {relative_path} ({file_size/1024:.1f}KB)")
-                return 0, 0
-
-            # Try different encodings
-            encodings = ['utf-8', 'utf-16', 'latin1', 'cp1252']
-            content = None
-            
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                        # Check if content is binary (contains null bytes or too many non-printable chars)
-                        if '\x00' in content or sum(not c.isprintable() for c in content) > len(content) * 0.3:
-                            print(f"Skipping binary file {relative_path}")
-                            return 0, 0
-                        break
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    print(f"Error reading file {relative_path} with {encoding}: {str(e)}")
-                    continue
-            
-            if content is None:
-                print(f"Could not read file {relative_path} with any encoding")
+            file_data = await self._read_file_in_pool(file_path, relative_path)
+            if file_data is None:
                 return 0, 0
-
-            # Extract methods if it's a source code file
-            methods = []
-            if any(relative_path.lower().endswith(ext) for ext in ['.py', '.js', '.ts', '.cs', '.java', '.cpp', '.go']):
-                methods = self._extract_methods(content)
+            content, methods = file_data
             
             # Generate embedding for the file content
             try:
-                # Truncate content if too long (approximately 6000 tokens)
-                if len(content) > 24000:  # Rough estimate: 1 token ≈ 4 characters
-                    content = content[:24000] + "\n... (content truncated due to length)"
-                
                 file_embedding = await self._get_cached_embedding(content)
             except Exception as e:
                 print(f"Error generating embedding for {relative_path}: {str(e)}")
                 return 0, 0
 
-            # Store file embedding with methods in metadata
-            await self._store_embeddings(
-                embeddings=file_embedding,
-                metadata={
-                    "type": "file",
-                    "path": relative_path,
-                    "size": len(content),
-                    "methods": [
-                        {
-                            "name": method["name"],
-                            "content": method["content"],
-                            "start_line": method.get("start_line", 0)
-                        }
-                        for method in methods
-                    ],
-                    "file_type": os.path.splitext(relative_path)[1].lower()
-                },
-                content=content,
-                file_path=relative_path,
-                code_type="file",
-                content_hash=self._get_file_hash(content)
-            )
-
+            await self._store_file_embedding(relative_path, content, methods, file_embedding)
             return len(methods), 1
 
         except Exception as e:
             print(f"Error processing file {relative_path}: {str(e)}")
             return 0, 0
 
+    async def _process_file_batch(self, batch: List[Tuple[str, str]]) -> List[Tuple[int, int]]:
+        """Process a batch of files with a single embeddings request, returning
+        (methods_count, embeddings_count) per file"""
+        results = [(0, 0)] * len(batch)
+        
+        # Read every file and extract its methods first, in parallel worker processes
+        read_results = await asyncio.gather(
+            *[self._read_file_in_pool(file_path, relative_path) for file_path, relative_path in batch],
+            return_exceptions=True
+        )
+        prepared = []
+        for index, ((_, relative_path), file_data) in enumerate(zip(batch, read_results)):
+            if isinstance(file_data, Exception):
+                print(f"Error processing file {relative_path}: {str(file_data)}")
+                continue
+            if file_data is not None:
+                prepared.append((index, relative_path, *file_data))
+        
+        if not prepared:
+            return results
+        
+        # Then embed all of them at once
+        try:
+            embeddings = await self._get_cached_embeddings([content for _, _, content, _ in prepared])
+        except Exception as e:
+            print(f"Error generating embeddings for batch: {str(e)}")
+            return results
+        
+        stored = await asyncio.gather(
+            *[self._store_file_embedding(relative_path, content, methods, embedding)
+              for (_, relative_path, content, methods), embedding in zip(prepared, embeddings)],
+            return_exceptions=True
+        )
+        for (index, relative_path, _, methods), outcome in zip(prepared, stored):
+            if isinstance(outcome, Exception):
+                print(f"Error processing file {relative_path}: {str(outcome)}")
+            else:
+                results[index] = (len(methods), 1)
+        
+        return results
+
+    async def _read_file_in_pool(self, file_path: str, relative_path: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Run _read_file in a worker process, replacing the pool once if a worker has died"""
+        if not RAG_EXTRACT_PROCESSES:
+            return await asyncio.to_thread(RAGService._read_file, file_path, relative_path)
+        
+        loop = asyncio.get_running_loop()
+        pool = self._get_cpu_pool()
+        try:
+            return await loop.run_in_executor(pool, RAGService._read_file, file_path, relative_path)
+        except BrokenProcessPool:
+            # Concurrent reads see the same broken pool; only the first replaces it
+            if self.cpu_pool is pool:
+                print("File processing pool broke, restarting it")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.cpu_pool = None
+            return await loop.run_in_executor(self._get_cpu_pool(), RAGService._read_file, file_path, relative_path)
+
+    @staticmethod
+    def _read_file(file_path: str, relative_path: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Read a file for indexing, returning its (possibly truncated) content and
+        extracted methods, or None if it should be skipped"""
+        # Check file size (skip if too large)
+        file_size = os.path.getsize(file_path)
+        if file_size > 100 * 1024:  # Skip files larger than 100KB
+            print(f"Skipping large file {relative_path} ({file_size/1024:.1f}KB)")
+            return None
+
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+        except Exception as e:
+            print(f"Error reading file {relative_path}: {str(e)}")
+            return None
+
+        # Try different encodings on the bytes read once
+        content = None
+        
+        for encoding in _FILE_ENCODINGS:
+            # A utf-16 file stream refuses input without a byte order mark
+            if encoding == 'utf-16' and not raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                continue
+            try:
+                content = raw.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+            # Match text-mode universal newlines
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+            # Check if content is binary (contains null bytes or too many non-printable chars)
+            if '\x00' in content or RAGService._count_non_printable(content) > len(content) * 0.3:
+                print(f"Skipping binary file {relative_path}")
+                return None
+            break
+        
+        if content is None:
+            print(f"Could not read file {relative_path} with any encoding")
+            return None
+
+        # Extract methods if it's a source code file
+        methods = []
+        if relative_path.lower().endswith(METHOD_EXTENSIONS):
+            methods = RAGService._extract_methods(content)
+        
+        # Truncate content if too long (approximately 6000 tokens)
+        if len(content) > 24000:  # Rough estimate: 1 token ≈ 4 characters
+            content = content[:24000] + "\n... (content truncated due to length)"
+        
+        return content, methods
+
+    @staticmethod
+    def _count_non_printable(content: str) -> int:
+        """Count characters in content that are not printable"""
+        if content.isascii():
+            return len(content.encode('ascii').translate(None, _PRINTABLE_ASCII))
+        return sum(not c.isprintable() for c in content)
+
+    async def _store_file_embedding(self, relative_path: str, content: str, methods: List[Dict[str, str]], embedding: List[float]):
+        """Store a file embedding with its methods in metadata"""
+        await self._store_embeddings(
+            embeddings=embedding,
+            metadata={
+                "type": "file",
+                "path": relative_path,
+                "size": len(content),
+                "methods": [
+                    {
+                        "name": method["name"],
+                        "content": method["content"],
+                        "start_line": method.get("start_line", 0)
+                    }
+                    for method in methods
+                ],
+                "file_type": os.path.splitext(relative_path)[1].lower()
+            },
+            content=content,
+            file_path=relative_path,
+            code_type="file",
+            content_hash=self._get_file_hash(content)
+        )
+
     def _is_code_file(self, filename: str) -> bool:
         """Check if the file is a code file based on extension"""
         code_extensions = {
@@ -306,36 +526,14 @@ class RAGService:
         }
         return any(filename.lower().endswith(ext) for ext in code_extensions)
 
-    def _extract_methods(self, content: str) -> List[Dict[str, str]]:
+    @staticmethod
+    def _extract_methods(content: str) -> List[Dict[str, str]]:
         """Extract methods from code content"""
-        import re
-        
         methods = []
+        if '(' not in content:
+            return methods
         lines = content.split('\n')
         
-        # More precise method patterns - only match actual function/method definitions
-        patterns = [
-            # Python functions: def methodName( - must not be preceded by assignment
-            (r'^\s*def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*:', 1, 'python_def'),
-            # Python async functions: async def methodName( - must not be preceded by assignment
-            (r'^\s*async\s+def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*:', 1, 'python_async_def'),
-            # JavaScript/TypeScript functions: function methodName(
-            (r'^\s*(?:export\s+)?(?:async\s+)?function\s+([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\([^)]*\)', 1, 'js_function'),
-            # JavaScript/TypeScript methods: methodName() {
-            (r'^\s*(?:async\s+)?([a-zA-Z_$][a-zA-Z0-9_$]*)\s*\([^)]*\)\s*\{', 1, 'js_method'),
-            # C# methods: public/private returnType MethodName(
-            (r'^\s*(?:public|private|protected|internal)\s+(?:static\s+)?(?:async\s+)?[a-zA-Z_<>[\]]+\s+([A-Z][a-zA-Z0-9_]*)\s*\([^)]*\)', 1, 'csharp_method'),
-            # Java methods: public/private returnType methodName(
-            (r'^\s*(?:public|private|protected)\s+(?:static\s+)?[a-zA-Z_<>[\]]+\s+([a-z][a-zA-Z0-9_]*)\s*\([^)]*\)', 1, 'java_method'),
-        ]
-        
-        # Keywords and built-ins to exclude
-        excluded_keywords = {
-            'if', 'for', 'while', 'def', 'class', 'return', 'import', 'from', 'try', 'except', 'with',
-            'function', 'var', 'let', 'const', 'new', 'this', 'super', 'static', 'public', 'private',
-            'protected', 'internal', 'async', 'await', 'yield', 'break', 'continue', 'switch', 'case'
-        }
-        
         for i, line in enumerate(lines, 1):
             # Skip lines that are clearly variable assignments
             stripped_line = line.strip()
@@ -344,6 +542,14 @@ class RAGService:
             if not stripped_line or stripped_line.startswith('#') or stripped_line.startswith('//'):
                 continue
             
+            # Every method pattern needs a parameter list, so lines without one can't match
+            if '(' not in line:
+                continue
+            
+            # Skip lines no method pattern matches before trying them one by one
+            if not _ANY_METHOD_RE.search(line):
+                continue
+            
             # Enhanced check for variable assignments
             if '=' in stripped_line:
                 equals_pos = stripped_line.find('=')
@@ -361,13 +567,13 @@ class RAGService:
                     if keyword_pos != -1 and equals_pos < keyword_pos:
                         continue
             
-            for pattern, group_idx, pattern_type in patterns:
-                match = re.search(pattern, line)
+            for pattern, group_idx, pattern_type in _METHOD_PATTERNS:
+                match = pattern.search(line)
                 if match:
                     method_name = match.group(group_idx)
                     
                     # Skip if it's a keyword or built-in
-                    if method_name.lower() in excluded_keywords:
+                    if method_name.lower() in _METHOD_EXCLUDED_KEYWORDS:
                         continue
                     
                     # Additional validation: method name should be reasonable
@@ -381,7 +587,7 @@ class RAGService:
                             continue
                         
                         # Skip if this looks like a dictionary or other assignment
-                        if re.match(r'^\s*[a-zA-Z_][a-zA-Z0-9_]*\s*=\s*{', stripped_line):
+                        if _DICT_ASSIGNMENT_RE.match(stripped_line):
                             continue
                     
                     # For method content, just use the method signature line
@@ -412,7 +618,8 @@ class RAGService:
                 "content_hash": content_hash
             }
             
-            result = self.supabase.table("code_embeddings").insert(data).execute()
+            query = self.supabase.table("code_embeddings").insert(data)
+            result = await asyncio.to_thread(query.execute)
             return result
             
         except Exception as e:
@@ -421,27 +628,36 @@ class RAGService:
     async def get_related_code(self, changes: List[CodeChange]) -> Dict[str, Any]:
         """Get related code for the given changes"""
         try:
-            # Step 1: Get direct file changes
+            # Step 1: Get direct file changes, one text section per change
             changed_files = set()
-            combined_text = ""
+            change_sections = []
             for change in changes:
                 changed_files.add(change.file_path)
                 if change.diff:
-                    combined_text += f"File: {change.file_path}\nDiff:\n{change.diff}\n\n"
+                    change_sections.append(f"File: {change.file_path}\nDiff:\n{change.diff}\n\n")
                 elif change.content:
-                    combined_text += f"File: {change.file_path}\nContent:\n{change.content}\n\n"
+                    change_sections.append(f"File: {change.file_path}\nContent:\n{change.content}\n\n")
 
-            if not combined_text:
+            if not change_sections:
                 raise ValueError("No valid content or diff found in changes")
 
-            # Step 2: Generate embedding for the changes
-            change_embedding = await self._get_cached_embedding(combined_text)
-            
-            # Step 3: Search for semantically similar code with a lower threshold
-            similar_code = await self._search_similar(change_embedding, limit=15, threshold=0.5)
+            async def search_similar_changes():
+                # Step 2: Generate embedding for the changes, embedding each section on its own
+                # so sections seen before come from the cache
+                try:
+                    section_embeddings = await self._get_cached_embeddings(change_sections)
+                except Exception as e:
+                    raise EmbeddingError(f"Failed to generate embeddings for changes: {str(e)}") from e
+                change_embedding = self._mean_embedding(section_embeddings)
+                
+                # Step 3: Search for semantically similar code with a lower threshold
+                return await self._search_similar(change_embedding, limit=15, threshold=0.5)
             
-            # Step 4: Search for direct references and dependencies
-            reference_results = await self._search_references(list(changed_files))
+            # Step 4: Search for direct references and dependencies while the similarity search runs
+            similar_code, reference_results = await asyncio.gather(
+                search_similar_changes(),
+                self._search_references(list(changed_files))
+            )
             
             # Step 5: Enhanced dependency analysis
             enhanced_deps = await self._analyze_enhanced_dependencies(changes, similar_code)
@@ -480,8 +696,10 @@ class RAGService:
                 }
             }
             
+        except RAGServiceError:
+            raise
         except Exception as e:
-            raise Exception(f"Failed to get related code: {str(e)}")
+            raise RAGServiceError(f"Failed to get related code: {str(e)}") from e
 
     async def _analyze_enhanced_dependencies(self, changes: List[CodeChange], similar_code: List[Dict]) -> Dict[str, Any]:
         """Enhanced dependency analysis using multiple strategies"""
@@ -522,11 +740,8 @@ class RAGService:
 
     def _extract_method_calls(self, content: str) -> List[str]:
         """Extract method calls from code content"""
-        import re
-        
-        # Pattern for method calls: word followed by parentheses
-        pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
-        matches = re.findall(pattern, content)
+        # Method calls: word followed by parentheses
+        matches = _CALL_RE.findall(content)
         
         # Filter out common keywords and built-ins
         keywords = {'if', 'for', 'while', 'def', 'class', 'return', 'import', 'from', 'try', 'except', 'with'}
@@ -534,36 +749,24 @@ class RAGService:
 
     def _extract_imports(self, content: str) -> List[str]:
         """Extract import statements from code content"""
-        import re
-        
         imports = []
         
         # Python imports
-        import_patterns = [
-            r'from\s+([a-zA-Z_][a-zA-Z0-9_.]*)\s+import',
-            r'import\s+([a-zA-Z_][a-zA-Z0-9_.]*)',
-        ]
-        
-        for pattern in import_patterns:
-            matches = re.findall(pattern, content)
-            imports.extend(matches)
+        for pattern in _IMPORT_RES:
+            imports.extend(pattern.findall(content))
         
         return list(set(imports))
 
     def _extract_data_flow(self, content: str) -> List[str]:
         """Extract data flow patterns from code content"""
-        import re
-        
         data_flow = []
         
         # Variable assignments
-        assignment_pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)\s*='
-        assignments = re.findall(assignment_pattern, content)
+        assignments = _ASSIGNMENT_RE.findall(content)
         data_flow.extend([f"assigns:{var}" for var in set(assignments)])
         
         # Function parameters
-        param_pattern = r'def\s+[a-zA-Z_][a-zA-Z0-9_]*\s*\(([^)]*)\)'
-        param_matches = re.findall(param_pattern, content)
+        param_matches = _PARAMS_RE.findall(content)
         for params in param_matches:
             if params.strip():
                 param_list = [p.strip().split('=')[0].strip() for p in params.split(',')]
@@ -573,25 +776,27 @@ class RAGService:
     async def _search_similar(self, query_embedding: List[float], limit: int = 5, threshold: float = 0.7):
         """Search for similar code using vector similarity"""
         try:
-            result = self.supabase.rpc(
+            query = self.supabase.rpc(
                 "match_code_embeddings",
                 {
                     "query_embedding": query_embedding,
                     "match_threshold": threshold,
                     "match_count": limit
                 }
-            ).execute()
+            )
+            result = await asyncio.to_thread(query.execute)
             
             return result.data
             
         except Exception as e:
-            raise Exception(f"Failed to search similar code: {str(e)}")
+            raise VectorSearchError(f"Failed to search similar code: {str(e)}") from e
 
     async def _search_references(self, file_paths: List[str]) -> Dict[str, Any]:
         """Search for direct references to and from the changed files"""
         try:
-            # Get all code embeddings that might contain references
-            result = self.supabase.table("code_embeddings").select("*").execute()
+            # Get all code embeddings that might contain references, without the vectors themselves
+            query = self.supabase.table("code_embeddings").select("file_path, content, metadata")
+            result = await asyncio.to_thread(query.execute)
             
             incoming_refs = []  # Files that reference the changed files
             outgoing_refs = []  # Files that are referenced by the changed files
@@ -680,4 +885,4 @@ class RAGService:
             }
             
         except Exception as e:
-            raise Exception(f"Failed to search references: {str(e)}") 
\ No newline at end of file
+            raise DependencyAnalysisError(f"Failed to search references: {str(e)}") from e 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
+import io
 import json
 import hashlib
 from ..models.analysis import ChangeAnalysisResponseWithCode, RiskLevel
@@ -259,36 +260,37 @@ TEST FOCUS: {', '.join(summary.test_focus_areas)}
         test_focus_areas = self._identify_test_focus_areas(analysis_response)
         
         # Start with the overall summary
-        result = f"{functional_summary}\n\nOverall change type: {change_type}, Risk level: {risk_level}\n"
-        result += f"Test focus areas: {', '.join(test_focus_areas)}\n\n"
+        result = io.StringIO()
+        result.write(f"{functional_summary}\n\nOverall change type: {change_type}, Risk level: {risk_level}\n")
+        result.write(f"Test focus areas: {', '.join(test_focus_areas)}\n\n")
         
         # Add file-by-file changes
         for component in analysis_response.changed_components:
-            result += f"In file {component.file_path}, the changes are:\n"
+            result.write(f"In file {component.file_path}, the changes are:\n")
             
             # Add methods changed in this file
             for method in component.methods:
-                result += f"  - {method.name} ({method.change_type}): {method.summary}\n"
-                result += f"    Impact: {method.impact_description}\n"
+                result.write(f"  - {method.name} ({method.change_type}): {method.summary}\n")
+                result.write(f"    Impact: {method.impact_description}\n")
             
             # Add impact information for this file
-            result += f"  File impact: {component.impact_description}\n"
+            result.write(f"  File impact: {component.impact_description}\n")
             
-            result += "\n"
+            result.write("\n")
         
         # Add dependency information if available
         if analysis_response.dependency_chains:
-            result += "Dependencies affected:\n"
+            result.write("Dependencies affected:\n")
             
             for chain in analysis_response.dependency_chains[:3]:  # Limit to top 3 dependencies
-                result += f"  - Changes in {chain.file_path} impact:\n"
+                result.write(f"  - Changes in {chain.file_path} impact:\n")
                 
                 for impacted_file in chain.impacted_files[:3]:  # Limit to top 3 impacted files
-                    result += f"    * {impacted_file.file_path}\n"
+                    result.write(f"    * {impacted_file.file_path}\n")
             
-            result += "\n"
+            result.write("\n")
         
-        return result.strip()
+        return result.getvalue().strip()
     
     def clear_cache(self):
         """Clear the summary cache"""
@@ -1,4 +1,5 @@
 import uuid
+import secrets
 import asyncio
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -9,8 +10,8 @@ from ..models.test_generation import (
 from ..services.azure_openai_service import AzureOpenAIService
 
 class TestGenerationService:
-    def __init__(self):
-        self.openai_service = AzureOpenAIService()
+    def __init__(self, openai_service: Optional[AzureOpenAIService] = None):
+        self.openai_service = openai_service or AzureOpenAIService()
         self.test_templates = self._load_test_templates()
     
     async def generate_tests(
@@ -52,7 +53,8 @@ class TestGenerationService:
             # Create traceability matrix
             traceability = self._create_traceability(modified_files, test_cases)
             
-            return TestGenerationResponse(
+            # All parts are already validated models, so skip re-validation
+            return TestGenerationResponse.model_construct(
                 test_generation_id=session_id,
                 summary=summary,
                 tests=test_cases,
@@ -174,7 +176,7 @@ class TestGenerationService:
             ))
         
         # Generate unique test case ID
-        test_id = f"test_{uuid.uuid4().hex[:8]}"
+        test_id = f"test_{secrets.token_hex(4)}"
         
         # Ensure only API or UI test types
         test_type = test_data.get('category', 'API')
@@ -0,0 +1,68 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+def stable_hash(text: Union[str, bytes]) -> str:
+    """Get a process-independent digest of text for use as a cache key"""
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class LRUCache(OrderedDict):
+    """Dictionary that evicts its least recently used entries beyond maxsize"""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key: Hashable, value: Any):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+# Maximum number of keys bound in one SQLite lookup
+SQLITE_MAX_KEYS_PER_QUERY = 500
+
+class SqliteCache:
+    """Persistent key/value cache in a local SQLite file, shared across processes and restarts.
+    Safe to call from worker threads; calls are serialized on one connection"""
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several worker processes read while one writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), SQLITE_MAX_KEYS_PER_QUERY):
+                chunk = keys[i:i + SQLITE_MAX_KEYS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(self.connection.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", items)
@@ -1,29 +1,38 @@
 import asyncio
 import logging
-from typing import Any, Callable, TypeVar, Optional
+from typing import Any, Callable, ClassVar, Dict, TypeVar, Optional
 from functools import wraps
 
 T = TypeVar('T')
 
+# Exact exception type -> HTTP status code, filled in as subclasses are defined
+EXCEPTION_STATUS_MAP: Dict[type, int] = {}
+
 class RAGServiceError(Exception):
     """Base exception for RAG service errors"""
-    pass
+    status_code: ClassVar[int] = 500
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        EXCEPTION_STATUS_MAP[cls] = cls.status_code
+
+EXCEPTION_STATUS_MAP[RAGServiceError] = RAGServiceError.status_code
 
 class EmbeddingError(RAGServiceError):
     """Error during embedding generation"""
-    pass
+    status_code = 502
 
 class VectorSearchError(RAGServiceError):
     """Error during vector search"""
-    pass
+    status_code = 502
 
 class DependencyAnalysisError(RAGServiceError):
     """Error during dependency analysis"""
-    pass
+    status_code = 500
 
 class RetryableError(RAGServiceError):
     """Error that can be retried"""
-    pass
+    status_code = 503
 
 def retry_async(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
     """Decorator for retrying async functions with exponential backoff"""
@@ -39,14 +48,14 @@ def retry_async(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
                 except RetryableError as e:
                     last_exception = e
                     if attempt < max_retries:
-                        logging.warning(f"Attempt {attempt + 1} failed: {e}. Retrying in {current_delay}s...")
+                        logging.warning("Attempt %d failed: %s. Retrying in %ss...", attempt + 1, e, current_delay)
                         await asyncio.sleep(current_delay)
                         current_delay *= backoff
                     else:
-                        logging.error(f"All {max_retries + 1} attempts failed")
+                        logging.error("All %d attempts failed", max_retries + 1)
                 except Exception as e:
                     # Non-retryable errors
-                    logging.error(f"Non-retryable error in {func.__name__}: {e}")
+                    logging.error("Non-retryable error in %s: %s", func.__name__, e)
                     raise
             
             raise last_exception
@@ -61,8 +70,8 @@ def handle_errors(error_type: type = RAGServiceError):
             try:
                 return await func(*args, **kwargs)
             except Exception as e:
-                logging.error(f"Error in {func.__name__}: {e}")
-                if isinstance(e, RAGServiceError):
+                logging.error("Error in %s: %s", func.__name__, e)
+                if type(e) in EXCEPTION_STATUS_MAP:
                     raise
                 raise error_type(f"Error in {func.__name__}: {str(e)}") from e
         return wrapper
@@ -0,0 +1,49 @@
+/*
+  # Switch similarity search to an HNSW index
+
+  1. Index Changes
+    - Replace the IVFFlat cosine index on `code_embeddings.embedding` with HNSW
+      (m = 16, ef_construction = 64). IVFFlat lists were sized once at creation
+      and recall degrades as rows are added; HNSW needs no retraining.
+
+  2. Function Changes
+    - `match_code_embeddings` filters on the raw cosine distance
+      (`embedding <=> query < 1 - threshold`) so the planner can walk the index
+      in distance order and stop at `match_count`
+    - Runs with `hnsw.ef_search = 40`; only the top rows leave the database
+*/
+
+-- Drop the IVFFlat index created with the table
+DROP INDEX IF EXISTS code_embeddings_embedding_idx;
+
+-- Create HNSW index for cosine similarity search
+CREATE INDEX IF NOT EXISTS idx_code_embeddings_embedding_hnsw
+ON code_embeddings
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Function to match similar code embeddings using the HNSW index
+create or replace function match_code_embeddings (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language sql stable
+set hnsw.ef_search = 40
+as $$
+  select
+    code_embeddings.id,
+    code_embeddings.content,
+    code_embeddings.metadata,
+    1 - (code_embeddings.embedding <=> query_embedding) as similarity
+  from code_embeddings
+  where code_embeddings.embedding <=> query_embedding < 1 - match_threshold
+  order by code_embeddings.embedding <=> query_embedding
+  limit match_count;
+$$;
@@ -0,0 +1,49 @@
+/*
+  # Search embeddings at half precision
+
+  1. Index Changes
+    - Replace the full-precision HNSW index with one built on
+      `embedding::halfvec(1536)`. Index pages shrink by half, so more of the
+      graph stays cached and cold queries read less from disk.
+    - The `embedding` column keeps full precision, so inserts and the
+      content-hash cache are unchanged. Requires pgvector 0.7 or later.
+
+  2. Function Changes
+    - `match_code_embeddings` compares at half precision to use the new index.
+      Its signature and result columns are unchanged.
+*/
+
+-- Drop the full-precision HNSW index
+DROP INDEX IF EXISTS idx_code_embeddings_embedding_hnsw;
+
+-- Create HNSW index on the half-precision embedding
+CREATE INDEX IF NOT EXISTS idx_code_embeddings_embedding_halfvec_hnsw
+ON code_embeddings
+USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Function to match similar code embeddings using the half-precision index
+create or replace function match_code_embeddings (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language sql stable
+set hnsw.ef_search = 40
+as $$
+  select
+    code_embeddings.id,
+    code_embeddings.content,
+    code_embeddings.metadata,
+    1 - (code_embeddings.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)) as similarity
+  from code_embeddings
+  where code_embeddings.embedding::halfvec(1536) <=> query_embedding::halfvec(1536) < 1 - match_threshold
+  order by code_embeddings.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+  limit match_count;
+$$;
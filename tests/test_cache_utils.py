@@ -0,0 +1,61 @@
+import pytest
+from app.utils.cache_utils import LRUCache, SqliteCache, stable_hash
+
+@pytest.fixture
+def cache_path(tmp_path):
+    """Path for a throwaway SQLite cache file"""
+    return str(tmp_path / "cache.db")
+
+class TestLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        """Test that reads refresh an entry so the oldest unread one is evicted"""
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+
+        assert cache.get("a") == 1
+        cache["c"] = 3
+
+        assert list(cache) == ["a", "c"]
+        assert cache.get("b") is None
+
+    def test_overwrite_does_not_grow(self):
+        """Test that re-setting a key keeps the size bounded"""
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["a"] = 2
+        cache["b"] = 3
+
+        assert len(cache) == 2
+        assert cache["a"] == 2
+
+class TestSqliteCache:
+
+    def test_persists_across_instances(self, cache_path):
+        """Test that values written by one instance are read by another"""
+        SqliteCache(cache_path).set_many([("a", b"1"), ("b", b"2")])
+
+        cache = SqliteCache(cache_path)
+
+        assert cache.get("a") == b"1"
+        assert cache.get("missing") is None
+        assert cache.get_many(["a", "b", "missing"]) == {"a": b"1", "b": b"2"}
+
+    def test_get_many_spans_query_chunks(self, cache_path):
+        """Test that lookups larger than one query's key limit return every match"""
+        cache = SqliteCache(cache_path)
+        cache.set_many((str(i), bytes([i % 256])) for i in range(1200))
+
+        assert len(cache.get_many([str(i) for i in range(1300)])) == 1200
+
+    def test_opens_in_wal_mode(self, cache_path):
+        """Test that the cache file uses write-ahead logging"""
+        cache = SqliteCache(cache_path)
+
+        assert cache.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_stable_hash_matches_for_str_and_bytes():
+    """Test that text and its UTF-8 bytes share a key"""
+    assert stable_hash("héllo") == stable_hash("héllo".encode("utf-8"))
+    assert len(stable_hash("x")) == 32
@@ -0,0 +1,44 @@
+import pytest
+from app.services.change_summary_service import ChangeSummaryService, MethodChange
+from app.services.method_extractor import MethodInfo
+
+@pytest.fixture
+def change_summary_service():
+    """Create ChangeSummaryService instance"""
+    return ChangeSummaryService()
+
+def make_method(**overrides):
+    """Create a MethodInfo with defaults for the fields under test"""
+    fields = dict(name="process", start_line=1, end_line=3, signature="def process(self):")
+    fields.update(overrides)
+    return MethodInfo(**fields)
+
+class TestChangeSummaryService:
+    
+    def test_signature_change_stays_high_impact(self, change_summary_service):
+        """Test that later, milder changes do not downgrade a breaking change"""
+        old_method = make_method(docstring="Old docs")
+        new_method = make_method(signature="def process(self, item):", is_static=True, docstring="New docs")
+        
+        result = change_summary_service._analyze_method_modification(old_method, new_method)
+        
+        assert result['impact_level'] == 'high'
+        assert len(result['details']) == 3
+
+    def test_documentation_change_is_low_impact(self, change_summary_service):
+        """Test that documentation-only changes are low impact"""
+        result = change_summary_service._analyze_method_modification(make_method(), make_method(docstring="Docs"))
+        
+        assert result['impact_level'] == 'low'
+        assert result['details'] == ["Documentation added"]
+
+    def test_assess_overall_impact_escalates_many_changes(self, change_summary_service):
+        """Test that many changes raise the overall impact by one level"""
+        changes = [
+            MethodChange(method_name=f"m{i}", change_type='modified', summary="", impact_level='low', details=[])
+            for i in range(6)
+        ]
+        
+        assert change_summary_service._assess_overall_impact(changes) == 'medium'
+        assert change_summary_service._assess_overall_impact(changes[:1]) == 'low'
+        assert change_summary_service._assess_overall_impact([]) == 'none'
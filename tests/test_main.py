@@ -0,0 +1,65 @@
+import os
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+
+# Services are created at import, so give the clients well-formed settings first
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test-key")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.signature")
+
+from app import main
+from app.models.analysis import CodeChange
+from app.utils.error_handling import EmbeddingError, VectorSearchError, RAGServiceError
+
+class FailingQuery:
+    """Supabase query whose execution fails"""
+    def execute(self):
+        raise ConnectionError("database unavailable")
+
+class FailingSupabase:
+    """Supabase client whose RPC calls fail"""
+    def rpc(self, name, params):
+        return FailingQuery()
+
+@pytest.fixture
+def client():
+    """Create a test client without running startup hooks"""
+    return TestClient(main.app)
+
+class TestErrorStatusCodes:
+
+    @pytest.mark.parametrize("error, status_code", [
+        (EmbeddingError("embeddings unavailable"), 502),
+        (VectorSearchError("search unavailable"), 502),
+        (RAGServiceError("indexing failed"), 500),
+    ])
+    def test_index_maps_service_errors_to_status(self, client, monkeypatch, error, status_code):
+        """Test that typed service errors become their HTTP status"""
+        async def fail(file):
+            raise error
+        monkeypatch.setattr(main.rag_service, "index_repository", fail)
+
+        response = client.post("/index", files={"file": ("repo.zip", b"zip", "application/zip")})
+
+        assert response.status_code == status_code
+        assert response.json()["detail"] == str(error)
+
+    def test_related_code_raises_vector_search_error(self, monkeypatch):
+        """Test that a failed similarity search surfaces as a VectorSearchError"""
+        service = main.rag_service
+        monkeypatch.setattr(service, "supabase", FailingSupabase())
+
+        async def embed(contents):
+            return [[1.0, 0.0] for _ in contents]
+
+        async def no_references(file_paths):
+            return {}
+
+        monkeypatch.setattr(service, "_get_cached_embeddings", embed)
+        monkeypatch.setattr(service, "_search_references", no_references)
+
+        with pytest.raises(VectorSearchError):
+            asyncio.run(service.get_related_code([CodeChange(file_path="a.py", change_type="modified", diff="+x")]))